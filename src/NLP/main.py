@@ -1,15 +1,58 @@
 from categorization import analyze_complaint
 from priority import analyze_priority
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 import json
 import logging
+import os
+import queue
+import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# In batch mode only every BATCH_LOG_EVERY-th complaint is logged, as a
+# progress line with its result
+BATCH_LOG_EVERY = int(os.environ.get('NLP_BATCH_LOG_EVERY', 100))
+
+DEFAULT_RESULT = {
+    'department_id': 5,  # General department
+    'priority_score': 2  # Medium priority
+}
+
+def configure_logging(level=logging.INFO):
+    """
+    Configure logging through a queue: the analysis thread only enqueues the
+    record, a background thread writes it to stderr
+    
+    Does nothing if the root logger already has handlers, e.g. when the
+    backend imports this module (see src/backend/log_pipeline.py)
+    
+    Returns:
+        QueueListener: The started listener, or None
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+# Configure logging
+configure_logging()
+
+def _analyze(complaint_text):
+    return {
+        'department_id': analyze_complaint(complaint_text),
+        'priority_score': analyze_priority(complaint_text)
+    }
+
 def analyze_complaint_text(complaint_text):
     """
     Main function to analyze complaint text and return department and priority
@@ -21,57 +64,65 @@ def analyze_complaint_text(complaint_text):
         dict: Dictionary containing department_id and priority_score
     """
     try:
-        # Log the incoming complaint
-        logger.info("Analyzing new complaint")
-        logger.debug(f"Complaint text: {complaint_text[:100]}...")  # Log first 100 chars
-        
-        # Get department ID
-        department_id = analyze_complaint(complaint_text)
-        logger.info(f"Department ID assigned: {department_id}")
-        
-        # Get priority score
-        priority_score = analyze_priority(complaint_text)
-        logger.info(f"Priority score assigned: {priority_score}")
-        
-        # Return results
-        result = {
-            'department_id': department_id,
-            'priority_score': priority_score
-        }
+        # Arguments instead of f-strings: the message is only built if the
+        # record is logged, and then by the logging thread
+        logger.debug("Complaint text: %.100s...", complaint_text)  # Log first 100 chars
+        
+        result = _analyze(complaint_text)
+        logger.info("Department ID assigned: %s, priority score assigned: %s",
+                    result['department_id'], result['priority_score'], extra=result)
         
         return result
         
     except Exception as e:
-        logger.error(f"Error analyzing complaint: {str(e)}")
+        logger.error("Error analyzing complaint: %s", e)
         # Return default values in case of error
-        return {
-            'department_id': 5,  # Default to General department
-            'priority_score': 2  # Default to Medium priority
-        }
+        return dict(DEFAULT_RESULT)
 
-def batch_analyze_complaints(complaints):
+def batch_analyze_complaints(complaints, log_every=None):
     """
     Analyze multiple complaints in batch
     
+    Per-complaint results are logged for every log_every-th complaint only,
+    and errors for the first failing complaint and then at the same rate, so
+    a large batch (or a broken model) doesn't flood the log.
+    
     Args:
         complaints (list): List of complaint texts
+        log_every (int): Log every n-th complaint (default BATCH_LOG_EVERY)
         
     Returns:
         list: List of analysis results
     """
     try:
-        logger.info(f"Starting batch analysis of {len(complaints)} complaints")
+        log_every = log_every or BATCH_LOG_EVERY
+        logger.info("Starting batch analysis of %d complaints", len(complaints))
+        start = time.perf_counter()
         
         results = []
-        for complaint in complaints:
-            result = analyze_complaint_text(complaint)
+        errors = 0
+        for number, complaint in enumerate(complaints, 1):
+            sampled = number % log_every == 0
+            try:
+                result = _analyze(complaint)
+                if sampled:
+                    logger.info("Batch progress: %d/%d, department ID %s, priority score %s",
+                                number, len(complaints), result['department_id'], result['priority_score'],
+                                extra=result)
+            except Exception as e:
+                errors += 1
+                if errors == 1 or sampled:
+                    logger.error("Error analyzing complaint %d of the batch (%d errors so far): %s",
+                                 number, errors, e)
+                result = dict(DEFAULT_RESULT)
             results.append(result)
             
-        logger.info("Batch analysis completed successfully")
+        logger.info("Batch analysis completed: %d complaints, %d errors in %.2fs",
+                    len(complaints), errors, time.perf_counter() - start)
         return results
         
     except Exception as e:
-        logger.error(f"Error in batch analysis: {str(e)}")
+        logger.error("Error in batch analysis: %s", e)
         return None
 
 def validate_complaint_text(text):
@@ -126,7 +177,7 @@ def process_complaint(complaint_data):
         return result
         
     except Exception as e:
-        logger.error(f"Error processing complaint: {str(e)}")
+        logger.error("Error processing complaint: %s", e)
         return {
             'status': 'error',
             'message': str(e),
@@ -1,3 +1,7 @@
+import re
+import sys
+from functools import lru_cache
+
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
@@ -8,18 +12,57 @@ nltk.download('stopwords')
 nltk.download('punkt_tab')
 nltk.download('wordnet')
 
-def preprocess_text(text):
+STOP_WORDS = frozenset(stopwords.words('english'))
+lemmatizer = WordNetLemmatizer()
+
+# Compiled regex approximation of word_tokenize used by the 'fast' mode:
+# numbers (3.5, 1,000, 10:30) and hyphenated words ("e-mail") stay whole,
+# contractions split like Treebank ("hasn't" -> "has", "n't"; "cannot" -> "can",
+# "not"), other punctuation becomes its own token. Unlike word_tokenize it
+# splits words with an inner apostrophe ("o'clock") and abbreviations ("dr.",
+# "u.s.a."), and leaves '"' quotes as they are.
+TOKEN_PATTERN = re.compile(
+    r"\d+(?:[.,:]\d+)+|\.\.\.|--|'(?:s|re|ve|ll|m|d)\b"
+    r"|\b(?:can(?=not\b)|gon(?=na\b)|got(?=ta\b)|wan(?=na\b)|gim(?=me\b)|lem(?=me\b))"
+    r"|\w+(?:-\w+)*(?=n't)|n't|\w+(?:-\w+)*|[^\w\s]"
+)
+
+@lru_cache(maxsize=20000)
+def lemmatize(word):
+    # Complaint vocabulary is small and repetitive: lemmatize each distinct word once
+    return lemmatizer.lemmatize(word)
+
+def preprocess_text(text, mode='nltk'):
+    """
+    mode: 'nltk' tokenizes with word_tokenize, 'fast' with TOKEN_PATTERN
+    """
     # Convert to lowercase
     text = text.lower()
     # Tokenize
-    tokens = word_tokenize(text)
-    # Remove stopwords
-    tokens = [word for word in tokens if word not in stopwords.words('english')]
-    # Lemmatize
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
+    tokens = TOKEN_PATTERN.findall(text) if mode == 'fast' else word_tokenize(text)
+    # Remove stopwords and lemmatize
+    tokens = [lemmatize(word) for word in tokens if word not in STOP_WORDS]
     return " ".join(tokens)
 
+def preprocess_batch(texts, mode='nltk'):
+    return [preprocess_text(text, mode) for text in texts]
+
 '''Example
 complaint = "The garbage hasn't been picked up in three weeks!"
 print("Preprocessed:", preprocess_text(complaint))'''
+
+if __name__ == "__main__":
+    # Show where the 'fast' mode differs from 'nltk': python preprocess.py <complaints.txt>
+    if len(sys.argv) != 2:
+        print("Usage: python preprocess.py <complaints.txt>  (one complaint per line)")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding='utf-8') as f:
+        complaints = [line.strip() for line in f if line.strip()]
+
+    expected = preprocess_batch(complaints, 'nltk')
+    actual = preprocess_batch(complaints, 'fast')
+    differences = [(text, a, b) for text, a, b in zip(complaints, expected, actual) if a != b]
+    print(f"Identical output: {len(complaints) - len(differences)}/{len(complaints)}")
+    for text, a, b in differences:
+        print(f"- {text[:80]}\n    nltk: {a}\n    fast: {b}")
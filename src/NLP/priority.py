@@ -1,6 +1,8 @@
 import spacy
 from textblob import TextBlob
+from collections import Counter
 import re
+import sys
 
 # Load English language model
 nlp = spacy.load("en_core_web_sm")
@@ -114,11 +116,84 @@ def analyze_entities(text):
     entity_count = sum(1 for ent in doc.ents if ent.label_ in critical_entities)
     return min(entity_count, 3)  # Cap the contribution of entities
 
+# Stages of classify_priority, cheapest first
+PRIORITY_STAGES = ('keywords', 'sentiment', 'entities')
+
+# How many decisions were made at each stage ('error' for failures)
+stage_counts = Counter()
+
+# Bounds of the score contributions: sentiment_factor * 3 is in [0, 3] and
+# entity_score * 2 in [0, 6]
+MAX_SENTIMENT_POINTS = 3
+MAX_ENTITY_POINTS = 6
+
+def decide_priority(max_weight, low, high):
+    """
+    Returns the priority determine_priority would give for any final score
+    between low and high, or None if that range still allows several
+    """
+    if max_weight >= 4 or low >= 12:
+        return 'HIGH'
+    if high < 12 and (max_weight >= 2 or low >= 6):
+        return 'MEDIUM'
+    if high < 6:
+        return 'LOW'
+    return None
+
+def classify_priority(text):
+    """
+    Staged version of determine_priority: the keyword stage runs first, and
+    the sentiment (TextBlob) and entity (spaCy) stages only run while their
+    score could still change the result. The priority is always the one
+    determine_priority_exhaustive returns.
+
+    Returns:
+        tuple: (priority, stage the decision was made at)
+    """
+    if not isinstance(text, str):
+        # Keep the exact error behaviour of the exhaustive version
+        return determine_priority_exhaustive(text), 'entities'
+
+    try:
+        urgency_score, max_weight = calculate_urgency_score(text)
+        priority = decide_priority(
+            max_weight, urgency_score, urgency_score + MAX_SENTIMENT_POINTS + MAX_ENTITY_POINTS
+        )
+        stage = 'keywords'
+
+        if priority is None:
+            sentiment_factor = (1 - calculate_sentiment_score(text)) / 2
+            score = urgency_score + (sentiment_factor * 3)
+            priority = decide_priority(max_weight, score, urgency_score + MAX_ENTITY_POINTS + (sentiment_factor * 3))
+            stage = 'sentiment'
+
+            if priority is None:
+                entity_score = analyze_entities(text)
+                final_score = urgency_score + (entity_score * 2) + (sentiment_factor * 3)
+                priority = decide_priority(max_weight, final_score, final_score)
+                stage = 'entities'
+
+    except Exception as e:
+        print(f"Error in priority analysis: {e}")
+        priority, stage = 'MEDIUM', 'error'
+
+    stage_counts[stage] += 1
+    return priority, stage
+
 def determine_priority(text):
     """
     Main function to determine complaint priority
     Returns 'HIGH', 'MEDIUM', or 'LOW'
     """
+    priority, stage = classify_priority(text)
+    return priority
+
+def determine_priority_exhaustive(text):
+    """
+    Reference implementation running every stage; classify_priority must
+    always agree with it
+    Returns 'HIGH', 'MEDIUM', or 'LOW'
+    """
     try:
         # Calculate various scores
         sentiment_score = calculate_sentiment_score(text)
@@ -158,4 +233,37 @@ def analyze_priority(text):
     Wrapper function to analyze complaint priority and return numeric score
     """
     priority = determine_priority(text)
-    return get_priority_score(priority) 
\ No newline at end of file
+    return get_priority_score(priority) 
+
+def compare_priority_engines(texts):
+    """
+    Runs the staged and exhaustive engines on the same texts
+
+    Returns:
+        dict: Texts where the priorities differ and decisions per stage
+    """
+    stages = Counter()
+    mismatches = []
+    for text in texts:
+        priority, stage = classify_priority(text)
+        expected = determine_priority_exhaustive(text)
+        stages[stage] += 1
+        if priority != expected:
+            mismatches.append((text, expected, priority))
+    return {'total': len(texts), 'stages': dict(stages), 'mismatches': mismatches}
+
+if __name__ == "__main__":
+    # Check the staged engine against the exhaustive one: python priority.py <complaints.txt>
+    if len(sys.argv) != 2:
+        print("Usage: python priority.py <complaints.txt>  (one complaint per line)")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding='utf-8') as f:
+        complaints = [line.strip() for line in f if line.strip()]
+
+    report = compare_priority_engines(complaints)
+    print(f"Texts: {report['total']}, mismatches: {len(report['mismatches'])}")
+    for stage in PRIORITY_STAGES + ('error',):
+        print(f"  decided at {stage}: {report['stages'].get(stage, 0)}")
+    for text, expected, priority in report['mismatches']:
+        print(f"- expected {expected}, got {priority}: {text[:80]}")
\ No newline at end of file
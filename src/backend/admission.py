@@ -0,0 +1,190 @@
+# admission.py
+#
+# Admission control for the expensive routes. Each pool caps the number of
+# requests running at once, lets a bounded number wait for a slot and sheds
+# the rest immediately with 503 + Retry-After, so a burst of complaint
+# submissions cannot tie up every worker thread.
+#
+# Limits are per process: with gunicorn, run threaded workers (threads > 1)
+# and size the pools per worker. The default concurrency caps are derived
+# from WEB_THREADS and together run at most WEB_THREADS - 1 requests, so one
+# thread is left for login, static files and the other routes. The queue depth
+# is a separate setting (ADMISSION_QUEUE_DEPTH, at least MIN_QUEUE_DEPTH): a
+# short burst waits queue_timeout for a slot instead of being shed at once.
+#
+# WEB_THREADS is only set under gunicorn (gunicorn.conf.py); the Flask dev
+# server and in-process runs have no fixed thread count, so admission control
+# is off there unless ADMISSION_CONTROL_ENABLED is set.
+
+import logging
+import threading
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+logger = logging.getLogger(__name__)
+
+# Share of the pooled threads given to the nlp pool, the rest goes to read
+NLP_SHARE = 1 / 3
+
+# Threads assumed when admission control is enabled without WEB_THREADS
+DEFAULT_THREADS = 4
+
+# Fewer waiting requests per pool would shed any small burst
+MIN_QUEUE_DEPTH = 2
+
+# Timeouts of the default pools
+DEFAULT_TIMEOUTS = {
+    # register_complaint: NLP + DB commit
+    'nlp': {'queue_timeout': 5, 'retry_after': 10},
+    # dashboards and complaint views
+    'read': {'queue_timeout': 2, 'retry_after': 2}
+}
+
+def default_pools(threads, queue_depth):
+    """
+    Pool settings for workers with the given number of threads
+
+    The threads - 1 pooled threads are shared out as the pools' concurrency
+    caps, e.g. for 4 threads: nlp 1 running, read 2 running. Each pool lets
+    queue_depth requests wait, but no fewer than MIN_QUEUE_DEPTH.
+
+    Returns:
+        dict: name -> settings, overridden by app.config['ADMISSION_POOLS']
+    """
+    budget = max(threads - 1, 2)
+    shares = {'nlp': max(1, int(budget * NLP_SHARE))}
+    shares['read'] = max(1, budget - shares['nlp'])
+    queue_depth = max(queue_depth, MIN_QUEUE_DEPTH)
+    return {
+        name: dict(DEFAULT_TIMEOUTS[name], max_concurrent=share, max_queue=queue_depth)
+        for name, share in shares.items()
+    }
+
+class AdmissionPool:
+    """
+    Concurrency cap with a bounded wait queue
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, retry_after):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+
+        # Counters exported by stats()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def acquire(self):
+        """
+        Takes a slot, waiting up to queue_timeout if the pool is full
+
+        Returns:
+            bool: True if admitted, False if the request must be shed
+        """
+        with self._condition:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                self.admitted += 1
+                return True
+
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                return False
+
+            self.waiting += 1
+            self.queued += 1
+            try:
+                has_slot = self._condition.wait_for(
+                    lambda: self.active < self.max_concurrent, self.queue_timeout
+                )
+            finally:
+                self.waiting -= 1
+
+            if not has_slot:
+                self.timed_out += 1
+                self.shed += 1
+                return False
+
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'shed': self.shed,
+                'timed_out': self.timed_out
+            }
+
+def get_pools(app):
+    """
+    Returns the admission pools of the app, creating them from
+    app.config['ADMISSION_POOLS'] on first use
+    """
+    pools = app.extensions.get('admission')
+    if pools is None:
+        threads = app.config.get('WEB_THREADS') or DEFAULT_THREADS
+        settings = default_pools(threads, app.config.get('ADMISSION_QUEUE_DEPTH', MIN_QUEUE_DEPTH))
+        for name, values in app.config.get('ADMISSION_POOLS', {}).items():
+            settings.setdefault(name, dict(settings['read'])).update(values)
+        running = sum(values['max_concurrent'] for values in settings.values())
+        if running >= threads:
+            logger.warning("Admission pools run up to %d requests with %d threads per worker; "
+                           "requests outside the pools can starve", running, threads)
+        pools = {name: AdmissionPool(name, **values) for name, values in settings.items()}
+        app.extensions['admission'] = pools
+    return pools
+
+def admission_stats(app):
+    return {name: pool.stats() for name, pool in get_pools(app).items()}
+
+def admission_control(pool_name, methods=None):
+    """
+    Route decorator that runs the view only when the named pool admits it
+    and answers 503 with Retry-After otherwise
+
+    Args:
+        pool_name (str): Pool from ADMISSION_POOLS
+        methods (tuple): Only these HTTP methods are controlled, e.g. ('POST',)
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('ADMISSION_CONTROL_ENABLED', True):
+                return f(*args, **kwargs)
+            if methods and request.method not in methods:
+                return f(*args, **kwargs)
+
+            pool = get_pools(current_app)[pool_name]
+            if not pool.acquire():
+                response = make_response(
+                    'The server is busy, please try again shortly.', 503
+                )
+                response.headers['Retry-After'] = str(pool.retry_after)
+                return response
+            try:
+                return f(*args, **kwargs)
+            finally:
+                pool.release()
+        return decorated_function
+    return decorator
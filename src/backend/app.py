@@ -1,16 +1,25 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from nlp import preprocess_text, categorize_complaint, assign_priority, analyze_sentiment
-from datetime import datetime, timedelta
+from sqlalchemy import case, event, func, or_
+from sqlalchemy.orm import joinedload
+from nlp import preprocess_text, categorize_complaint, assign_priority, load_resources, resource_version
+from admission import DEFAULT_THREADS, admission_control, admission_stats
+from identity_cache import get_profile, get_department_names, register_models
+import dashboard_cache
+import events
+import shadow
+import profiler
+import log_pipeline
+from session_store import DatabaseSessionInterface
+from geo import parse_location, encode_geohash, covering_cells, distance_km, decode_geohash
+from datetime import date, datetime, timedelta
 from functools import wraps
 
-import nltk
-
-# Download necessary NLTK resources
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('wordnet')
-nltk.download('vader_lexicon')
+import gc
+import hmac
+import logging
+import os
+import time
 
 app = Flask(__name__)
 
@@ -22,11 +31,88 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 
-db = SQLAlchemy(app)
+# Sessions: 'cookie' (signed cookie) or 'db' (server-side, see session_store.py).
+# last_activity is only rewritten once it is SESSION_TOUCH_INTERVAL seconds
+# old, so an idle session ends between SESSION_IDLE_TIMEOUT and
+# SESSION_IDLE_TIMEOUT + SESSION_TOUCH_INTERVAL after the last request.
+app.config['SESSION_STORE'] = 'cookie'
+app.config['SESSION_TOUCH_INTERVAL'] = 60
+app.config['SESSION_IDLE_TIMEOUT'] = timedelta(minutes=30)
+
+# Threads per worker process under gunicorn, which sets the variable
+# (gunicorn.conf.py); None for the Flask dev server and in-process runs,
+# which have no fixed thread count
+app.config['WEB_THREADS'] = int(os.environ['WEB_THREADS']) if os.environ.get('WEB_THREADS') else None
+
+# Admission control: per-process concurrency caps and wait queues, see admission.py.
+# On by default only with a known WEB_THREADS, from which the concurrency caps
+# are derived. ADMISSION_QUEUE_DEPTH requests may wait per pool (at least
+# admission.MIN_QUEUE_DEPTH); ADMISSION_POOLS overrides single settings,
+# e.g. {'nlp': {'retry_after': 30}}.
+app.config['ADMISSION_CONTROL_ENABLED'] = app.config['WEB_THREADS'] is not None
+app.config['ADMISSION_QUEUE_DEPTH'] = int(os.environ.get('ADMISSION_QUEUE_DEPTH', 4))
+app.config['ADMISSION_POOLS'] = {}
+
+# Token expected in the STATS_HEADER header by /admission-stats and
+# /shadow-stats; with no token set they answer 404
+app.config['STATS_TOKEN'] = None
+app.config['STATS_HEADER'] = 'X-Stats-Token'
+
+# Seconds a cached citizen/department profile may be served, see identity_cache.py
+app.config['IDENTITY_CACHE_TTL'] = 60
+
+# Seconds rendered dashboard pages and complaint cards are kept, see dashboard_cache.py
+app.config['DASHBOARD_CACHE_TTL'] = 300
+
+# Live updates over server-sent events, see events.py. 'pubsub' only reaches
+# streams in the same process and holds a worker thread per open stream; 'poll'
+# answers with one database poll per request and is what gunicorn.conf.py
+# sets. At most EVENTS_MAX_STREAMS 'pubsub' streams are open per process.
+app.config['EVENTS_MODE'] = os.environ.get('EVENTS_MODE', 'pubsub')
+app.config['EVENTS_POLL_INTERVAL'] = 5
+app.config['EVENTS_HEARTBEAT'] = 15
+app.config['EVENTS_MAX_STREAM_SECONDS'] = 300
+app.config['EVENTS_MAX_STREAMS'] = max(1, (app.config['WEB_THREADS'] or DEFAULT_THREADS) // 4)
+app.config['EVENTS_RETRY_AFTER'] = 30
+
+# Archival of resolved complaints, see archive.py
+app.config['ARCHIVE_AFTER_DAYS'] = 180
+app.config['ARCHIVE_BATCH_SIZE'] = 500
+
+# SLA escalation of untouched open complaints, see escalation.py. Days without
+# a status update before a complaint moves up one priority; per-department
+# overrides are keyed by department ID, e.g. {3: {'LOW': 10}}.
+app.config['ESCALATION_SLA_DAYS'] = {'LOW': 30, 'MEDIUM': 14}
+app.config['ESCALATION_DEPARTMENT_SLA_DAYS'] = {}
+app.config['ESCALATION_BATCH_SIZE'] = 500
+
+# Shadow comparison of the candidate NLP engine in src/NLP, see shadow.py
+app.config['SHADOW_MODE_ENABLED'] = False
+app.config['SHADOW_SAMPLE_RATE'] = 1.0
+app.config['SHADOW_MAX_PENDING'] = 100
+
+# Per-request cProfile, see profiler.py. Only installed by configure_app() when
+# enabled; requests are profiled when they send PROFILER_HEADER with
+# PROFILER_TOKEN or are sampled at PROFILER_SAMPLE_RATE. PROFILER_ROUTES
+# limits it to some endpoints, e.g. ['register_complaint'].
+app.config['PROFILER_ENABLED'] = False
+app.config['PROFILER_SAMPLE_RATE'] = 0.0
+app.config['PROFILER_HEADER'] = 'X-Profile'
+app.config['PROFILER_TOKEN'] = None
+app.config['PROFILER_ROUTES'] = None
+app.config['PROFILER_DIR'] = os.path.join(app.root_path, 'profiles')
 
-# Initialize database
-with app.app_context():
-    db.create_all()
+# Logging, see log_pipeline.py. Records are queued and written to LOG_FILE as
+# JSON lines by a background thread; LOG_FILE = None (the default, set the
+# LOG_FILE variable to enable it) leaves logging as it is, on stderr.
+# LOG_REQUESTS adds one access log record per request (endpoint, status,
+# duration_ms). Records beyond LOG_QUEUE_SIZE waiting to be written are dropped.
+app.config['LOG_FILE'] = os.environ.get('LOG_FILE') or None
+app.config['LOG_LEVEL'] = 'INFO'
+app.config['LOG_QUEUE_SIZE'] = 10000
+app.config['LOG_REQUESTS'] = True
+
+db = SQLAlchemy()
 
 # Define models for the database
 class Citizen(db.Model):
@@ -50,6 +136,26 @@ class Complaint(db.Model):
     priority = db.Column(db.Enum('LOW', 'MEDIUM', 'HIGH'), nullable=False)
     date_submitted = db.Column(db.Date, nullable=True)
 
+    # Location as entered, and either its coordinates (with their geohash,
+    # kept up to date on insert/update) or a normalized place key, see geo.py
+    location = db.Column(db.String(200))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
+    location_key = db.Column(db.String(100), index=True)
+    # Version of the NLP resources that classified the complaint, see nlp.resource_version()
+    nlp_version = db.Column(db.String(40))
+    # Bumped by every in-place update of the row (escalation, reclassification),
+    # so the dashboard version sees changes that add no log
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # Per-department time window scans (hotspots, SLA checks)
+        db.Index('ix_complaints_department_date', 'department_id', 'date_submitted'),
+    )
+
+    archived = False
+
     # Define relationships properly
     citizen = db.relationship('Citizen', backref=db.backref('complaints', lazy=True))
     department = db.relationship('Department', backref=db.backref('complaints', lazy=True))
@@ -73,9 +179,29 @@ class ComplaintLog(db.Model):
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
     remarks = db.Column(db.Text)
 
+    __table_args__ = (
+        # Latest log of a complaint (dashboard cards, SLA checks)
+        db.Index('ix_complaint_log_complaint_log', 'complaint_id', 'log_id'),
+    )
+
     # Relationship to link logs to the complaint
     complaint = db.relationship('Complaint', backref=db.backref('logs', cascade='all, delete-orphan'))
 
+class ComplaintEscalation(db.Model):
+    __tablename__ = 'complaint_escalations'
+
+    # Priority raised by escalation.py; the latest one restarts the SLA clock
+    escalation_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    complaint_id = db.Column(db.Integer, db.ForeignKey('complaints.complaint_id'), nullable=False)
+    old_priority = db.Column(db.Enum('LOW', 'MEDIUM', 'HIGH'), nullable=False)
+    new_priority = db.Column(db.Enum('LOW', 'MEDIUM', 'HIGH'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    remarks = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_complaint_escalations_complaint_timestamp', 'complaint_id', 'timestamp'),
+    )
+
 class Feedback(db.Model):
     __tablename__ = 'feedback'
 
@@ -88,6 +214,108 @@ class Feedback(db.Model):
     # Relationship to link feedback to complaint
     complaint = db.relationship('Complaint', backref=db.backref('feedback', cascade='all, delete-orphan'))
 
+class ComplaintTerm(db.Model):
+    __tablename__ = 'complaint_terms'
+
+    # Inverted index of the preprocessed complaint text (term -> complaints),
+    # used by reclassify.py to find the complaints a keyword change affects
+    term = db.Column(db.String(100), primary_key=True)
+    complaint_id = db.Column(db.Integer, db.ForeignKey('complaints.complaint_id'), primary_key=True, index=True)
+
+class StoredSession(db.Model):
+    __tablename__ = 'sessions'
+
+    # Server-side session data when SESSION_STORE = 'db', see session_store.py
+    session_id = db.Column(db.String(32), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Cached profiles and department names are dropped when these rows are written
+register_models(Citizen, Department)
+
+@event.listens_for(Complaint, 'before_insert')
+@event.listens_for(Complaint, 'before_update')
+def index_complaint_location(mapper, connection, complaint):
+    # Keep the geohash index in step with the coordinates
+    if complaint.latitude is not None and complaint.longitude is not None:
+        complaint.geohash = encode_geohash(complaint.latitude, complaint.longitude)
+    else:
+        complaint.geohash = None
+
+def index_complaint_terms(complaint_id, processed_text):
+    """
+    Adds the distinct words of a preprocessed complaint text to the term index
+    """
+    terms = {term[:100] for term in processed_text.split()}
+    if terms:
+        db.session.execute(ComplaintTerm.__table__.insert(), [
+            {'term': term, 'complaint_id': complaint_id} for term in terms
+        ])
+
+# Archive tables: resolved complaints moved out of the hot tables by archive.py.
+# Same columns as the hot tables plus the time the row was archived.
+class ArchivedComplaint(db.Model):
+    __tablename__ = 'archived_complaints'
+
+    complaint_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    citizen_id = db.Column(db.Integer, db.ForeignKey('citizens.citizen_id'), nullable=False, index=True)
+    category = db.Column(db.String(50))
+    description = db.Column(db.Text, nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.department_id'), nullable=False, index=True)
+    priority = db.Column(db.Enum('LOW', 'MEDIUM', 'HIGH'), nullable=False)
+    date_submitted = db.Column(db.Date, nullable=True)
+    location = db.Column(db.String(200))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
+    location_key = db.Column(db.String(100))
+    nlp_version = db.Column(db.String(40))
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    archived = True
+
+    citizen = db.relationship('Citizen')
+    department = db.relationship('Department')
+
+class ArchivedComplaintLog(db.Model):
+    __tablename__ = 'archived_complaint_log'
+
+    log_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    complaint_id = db.Column(db.Integer, db.ForeignKey('archived_complaints.complaint_id'), nullable=False, index=True)
+    status = db.Column(db.Enum('In-progress', 'Resolved', 'Not resolved'), nullable=False)
+    timestamp = db.Column(db.DateTime)
+    remarks = db.Column(db.Text)
+
+    complaint = db.relationship('ArchivedComplaint', backref=db.backref('logs', cascade='all, delete-orphan'))
+
+class ArchivedComplaintEscalation(db.Model):
+    __tablename__ = 'archived_complaint_escalations'
+
+    escalation_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    complaint_id = db.Column(db.Integer, db.ForeignKey('archived_complaints.complaint_id'), nullable=False, index=True)
+    old_priority = db.Column(db.Enum('LOW', 'MEDIUM', 'HIGH'), nullable=False)
+    new_priority = db.Column(db.Enum('LOW', 'MEDIUM', 'HIGH'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    remarks = db.Column(db.Text)
+
+class ArchivedFeedback(db.Model):
+    __tablename__ = 'archived_feedback'
+
+    feedback_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    complaint_id = db.Column(db.Integer, db.ForeignKey('archived_complaints.complaint_id'), nullable=False, index=True)
+    rating = db.Column(db.Integer)
+    comments = db.Column(db.Text)
+    date_provided = db.Column(db.Date)
+
+    complaint = db.relationship('ArchivedComplaint', backref=db.backref('feedback', cascade='all, delete-orphan'))
+
+# Complaint statuses a department can set
+VALID_STATUSES = ['In-progress', 'Resolved', 'Not resolved']
+
+# Upper bound on complaints changed by one bulk status update
+MAX_BULK_UPDATE = 500
+
 # Validation functions
 def validate_email(email):
     import re
@@ -118,6 +346,16 @@ def department_login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def stats_token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        expected = app.config['STATS_TOKEN']
+        token = request.headers.get(app.config['STATS_HEADER'])
+        if not expected or token is None or not hmac.compare_digest(token, expected):
+            return jsonify({'error': 'Not found'}), 404
+        return f(*args, **kwargs)
+    return decorated_function
+
 # Routes
 @app.route('/')
 def index():
@@ -179,6 +417,8 @@ def citizen_login():
 
         citizen = Citizen.query.filter_by(email=email, contact_number=contact_number).first()
         if citizen:
+            # New session ID on login, so one planted before it is useless
+            session.clear()
             session['citizen_id'] = citizen.citizen_id
             session['last_activity'] = datetime.now().timestamp()
             flash('Login successful!', 'success')
@@ -192,19 +432,28 @@ def citizen_login():
 # Citizen Dashboard Route
 @app.route('/citizen-dashboard')
 @citizen_login_required
+@admission_control('read')
 def citizen_dashboard():
-    citizen = Citizen.query.get(session['citizen_id'])
+    citizen = get_profile(Citizen, session['citizen_id'])
     if not citizen:
         session.clear()
         flash('Account not found', 'error')
         return redirect(url_for('citizen_login'))
     
     complaints = Complaint.query.filter_by(citizen_id=citizen.citizen_id).all()
-    return render_template('citizen_dashboard.html', citizen=citizen, complaints=complaints)
+
+    # Archived complaints are only read when the citizen asks for history
+    show_history = request.args.get('history') == '1'
+    if show_history:
+        complaints += ArchivedComplaint.query.filter_by(citizen_id=citizen.citizen_id).all()
+
+    return render_template('citizen_dashboard.html', citizen=citizen, complaints=complaints,
+                           show_history=show_history)
 
 # Register Complaint Route
 @app.route('/register-complaint', methods=['GET', 'POST'])
 @citizen_login_required
+@admission_control('nlp', methods=('POST',))
 def register_complaint():
     if request.method == 'POST':
         description = request.form.get('description')
@@ -215,9 +464,15 @@ def register_complaint():
         
         try:
             # Process complaint using NLP
+            nlp_start = time.perf_counter()
             processed_text = preprocess_text(description)
             category, department_id = categorize_complaint(processed_text)
             priority = assign_priority(processed_text)
+            nlp_seconds = time.perf_counter() - nlp_start
+
+            # Coordinates ("lat, lon") or a place name
+            location = request.form.get('location', '').strip() or None
+            latitude, longitude, location_key = parse_location(location)
             
             # Create new complaint
             complaint = Complaint(
@@ -226,43 +481,48 @@ def register_complaint():
                 category=category,
                 department_id=department_id,
                 priority=priority,
-                date_submitted=datetime.now().date()
+                date_submitted=datetime.now().date(),
+                location=location[:200] if location else None,
+                latitude=latitude,
+                longitude=longitude,
+                location_key=location_key,
+                nlp_version=resource_version()
             )
             
             db.session.add(complaint)
+            db.session.flush()
+            index_complaint_terms(complaint.complaint_id, processed_text)
             db.session.commit()
+
+            events.publish_complaint_event('created', complaint.complaint_id, complaint.department_id,
+                                           complaint.citizen_id, priority=complaint.priority)
+            shadow.submit(description, department_id, priority, nlp_seconds)
             
             flash('Complaint registered successfully!', 'success')
             return redirect(url_for('citizen_dashboard'))
             
         except Exception as e:
             db.session.rollback()
+            app.logger.exception("Error registering complaint")
             flash(f'Error registering complaint: {str(e)}', 'error')
             return redirect(url_for('register_complaint'))
     
-    citizen = Citizen.query.get(session['citizen_id'])
+    citizen = get_profile(Citizen, session['citizen_id'])
     return render_template('register_complaint.html', citizen=citizen)
 
 # View Complaint Route
 @app.route('/view-complaint/<int:complaint_id>')
 @citizen_login_required
+@admission_control('read')
 def view_complaint(complaint_id):
-    complaint = Complaint.query.get_or_404(complaint_id)
+    complaint = Complaint.query.get(complaint_id) or ArchivedComplaint.query.get_or_404(complaint_id)
     
     if complaint.citizen_id != session['citizen_id']:
         flash('Unauthorized access', 'error')
         return redirect(url_for('citizen_dashboard'))
     
     # Get department name from the department_id
-    department_names = {
-        1: "Sanitation",
-        2: "Water",
-        3: "Infrastructure",
-        4: "Public Safety",
-        5: "General"
-    }
-    
-    department_name = department_names.get(complaint.department_id, "Unknown Department")
+    department_name = get_department_names(Department).get(complaint.department_id, "Unknown Department")
     
     return render_template('view_complaint.html', 
                          complaint=complaint,
@@ -322,6 +582,8 @@ def department_login():
         ).first()
 
         if department:
+            # New session ID on login, so one planted before it is useless
+            session.clear()
             session['department_id'] = department.department_id
             session['last_activity'] = datetime.now().timestamp()
             flash('Login successful!', 'success')
@@ -335,8 +597,9 @@ def department_login():
 # Department Dashboard Route
 @app.route('/department-dashboard')
 @department_login_required
+@admission_control('read')
 def department_dashboard():
-    department = Department.query.get(session['department_id'])
+    department = get_profile(Department, session['department_id'])
     if not department:
         session.clear()
         flash('Department not found', 'error')
@@ -344,25 +607,311 @@ def department_dashboard():
 
     # Get status filter from query parameters
     status = request.args.get('status', 'all')
-    
-    # Base query
-    complaints_query = Complaint.query.filter_by(department_id=department.department_id)
-    
+    show_history = request.args.get('history') == '1'
+
+    # Answer unchanged reloads from the browser or page cache
+    version = department_data_version(department.department_id, show_history)
+    etag = dashboard_cache.make_etag(department.department_id, department.name, status, show_history, version,
+                                     date.today())
+    if etag in request.if_none_match:
+        return dashboard_cache.not_modified(etag)
+
+    page = dashboard_cache.cached_page(etag)
+    if page is None:
+        page = render_template('department_dashboard.html',
+                               department_name=department.name,
+                               cards=department_complaint_cards(department.department_id, status, show_history),
+                               selected_status=status,
+                               show_history=show_history,
+                               hotspots=department_hotspots(department.department_id, date.today() - timedelta(days=7)))
+        dashboard_cache.cache_page(etag, page)
+
+    return dashboard_cache.etag_response(page, etag)
+
+def department_data_version(department_id, show_history):
+    """
+    Summarizes the department's complaints and logs; any complaint or status
+    update added or removed, and any in-place update of a complaint (which
+    bumps its revision), changes the result
+    """
+    complaints = db.session.query(
+        func.count(Complaint.complaint_id), func.max(Complaint.complaint_id),
+        func.coalesce(func.sum(Complaint.revision), 0)
+    ).filter(Complaint.department_id == department_id).one()
+    logs = db.session.query(
+        func.count(ComplaintLog.log_id), func.max(ComplaintLog.log_id)
+    ).join(Complaint).filter(Complaint.department_id == department_id).one()
+
+    version = (tuple(complaints), tuple(logs))
+    if show_history:
+        archived = db.session.query(
+            func.count(ArchivedComplaint.complaint_id), func.max(ArchivedComplaint.complaint_id)
+        ).filter(ArchivedComplaint.department_id == department_id).one()
+        version += (tuple(archived),)
+    return version
+
+def department_complaint_cards(department_id, status, show_history):
+    """
+    Rendered complaint cards for the dashboard
+
+    The latest log of every complaint is found with one query; only the
+    complaints whose card is not cached for that log are loaded (with their
+    citizen, in one more query) and rendered.
+    """
+    latest = db.session.query(
+        ComplaintLog.complaint_id, func.max(ComplaintLog.log_id).label('log_id')
+    ).join(Complaint).filter(
+        Complaint.department_id == department_id
+    ).group_by(ComplaintLog.complaint_id).subquery()
+
+    rows_query = db.session.query(
+        Complaint.complaint_id, Complaint.priority, Complaint.category, latest.c.log_id, ComplaintLog.status,
+        Citizen.name, Citizen.contact_number
+    ).join(Citizen, Citizen.citizen_id == Complaint.citizen_id).outerjoin(
+        latest, latest.c.complaint_id == Complaint.complaint_id
+    ).outerjoin(
+        ComplaintLog, ComplaintLog.log_id == latest.c.log_id
+    ).filter(Complaint.department_id == department_id)
+
     # Apply status filter if not 'all'
     if status != 'all':
-        complaints_query = complaints_query.join(ComplaintLog).filter(ComplaintLog.status == status)
-    
-    complaints = complaints_query.all()
-    
-    # Add latest status to each complaint
-    for complaint in complaints:
-        latest_log = ComplaintLog.query.filter_by(complaint_id=complaint.complaint_id).order_by(ComplaintLog.timestamp.desc()).first()
+        with_status = db.session.query(ComplaintLog.complaint_id).filter(ComplaintLog.status == status)
+        rows_query = rows_query.filter(Complaint.complaint_id.in_(with_status))
+
+    rows = rows_query.order_by(Complaint.complaint_id).all()
+
+    cards = {}
+    missing = {}
+    for complaint_id, priority, category, log_id, latest_status, name, contact_number in rows:
+        key = ('complaint', complaint_id, priority, category, log_id, name, contact_number)
+        cards[complaint_id] = dashboard_cache.cached_card(key)
+        if cards[complaint_id] is None:
+            missing[complaint_id] = (key, latest_status or 'Pending')
+
+    if missing:
+        complaints = Complaint.query.options(joinedload(Complaint.citizen)).filter(
+            Complaint.complaint_id.in_(list(missing))
+        ).all()
+        for complaint in complaints:
+            key, complaint.latest_status = missing[complaint.complaint_id]
+            cards[complaint.complaint_id] = dashboard_cache.render_card(key, complaint)
+
+    cards = [cards[complaint_id] for complaint_id, *_ in rows]
+
+    # Archived complaints are all resolved and only read when history is requested
+    if show_history and status in ('all', 'Resolved'):
+        archived = ArchivedComplaint.query.options(joinedload(ArchivedComplaint.citizen)).filter_by(
+            department_id=department_id
+        ).all()
+        for complaint in archived:
+            key = ('archived', complaint.complaint_id, complaint.citizen.name, complaint.citizen.contact_number)
+            card = dashboard_cache.cached_card(key)
+            if card is None:
+                complaint.latest_status = 'Resolved'
+                card = dashboard_cache.render_card(key, complaint)
+            cards.append(card)
+
+    return cards
+
+def department_complaint_card(department_id, complaint_id):
+    """
+    Rendered card of one of the department's complaints, or None
+    """
+    complaint = Complaint.query.options(joinedload(Complaint.citizen)).filter_by(
+        complaint_id=complaint_id, department_id=department_id
+    ).first()
+    if not complaint:
+        return None
+
+    latest_log = ComplaintLog.query.filter_by(complaint_id=complaint_id).order_by(ComplaintLog.log_id.desc()).first()
+    key = ('complaint', complaint_id, complaint.priority, complaint.category,
+           latest_log.log_id if latest_log else None, complaint.citizen.name, complaint.citizen.contact_number)
+    card = dashboard_cache.cached_card(key)
+    if card is None:
         complaint.latest_status = latest_log.status if latest_log else 'Pending'
+        card = dashboard_cache.render_card(key, complaint)
+    return card
+
+@app.route('/department-dashboard/card/<int:complaint_id>')
+@department_login_required
+def department_dashboard_card(complaint_id):
+    # Used by the dashboard to patch a single card on a live update
+    card = department_complaint_card(session['department_id'], complaint_id)
+    if card is None:
+        return '', 404
+    return card
+
+def poll_events(cursor, department_id=None, citizen_id=None):
+    """
+    Complaints and status logs added after the cursor, for the EVENTS_MODE
+    'poll' streams
+
+    Returns:
+        tuple: (events, new cursor)
+    """
+    last_complaint_id, last_log_id = cursor
+    scope = (Complaint.department_id == department_id if department_id is not None
+             else Complaint.citizen_id == citizen_id)
+    try:
+        new_complaints = db.session.query(Complaint.complaint_id, Complaint.priority).filter(
+            scope, Complaint.complaint_id > last_complaint_id
+        ).order_by(Complaint.complaint_id).all()
+        new_logs = db.session.query(ComplaintLog.log_id, ComplaintLog.complaint_id, ComplaintLog.status).join(
+            Complaint
+        ).filter(scope, ComplaintLog.log_id > last_log_id).order_by(ComplaintLog.log_id).all()
+    finally:
+        # Don't hold a pooled connection while the stream sleeps
+        db.session.remove()
+
+    stream_events = [{'type': 'created', 'complaint_id': complaint_id, 'priority': priority}
+                     for complaint_id, priority in new_complaints]
+    stream_events += [{'type': 'status', 'complaint_id': complaint_id, 'status': status}
+                      for log_id, complaint_id, status in new_logs]
+    if new_complaints:
+        last_complaint_id = new_complaints[-1].complaint_id
+    if new_logs:
+        last_log_id = new_logs[-1].log_id
+    return stream_events, (last_complaint_id, last_log_id)
+
+def event_stream_response(channel, poll):
+    if app.config['EVENTS_MODE'] == 'poll':
+        cursor = events.parse_cursor(request.headers.get('Last-Event-ID'))
+        if cursor is None:
+            cursor = (
+                db.session.query(func.coalesce(func.max(Complaint.complaint_id), 0)).scalar(),
+                db.session.query(func.coalesce(func.max(ComplaintLog.log_id), 0)).scalar()
+            )
+        stream = events.polling_stream(poll, cursor, app.config['EVENTS_POLL_INTERVAL'])
+    else:
+        # An open stream holds its worker thread until it ends
+        if not events.stream_slots.acquire(app.config['EVENTS_MAX_STREAMS']):
+            response = make_response('Too many open event streams, please try again shortly.', 503)
+            response.headers['Retry-After'] = str(app.config['EVENTS_RETRY_AFTER'])
+            return response
+        stream = events.pubsub_stream(channel, app.config['EVENTS_HEARTBEAT'],
+                                      app.config['EVENTS_MAX_STREAM_SECONDS'])
+
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if app.config['EVENTS_MODE'] != 'poll':
+        response.call_on_close(events.stream_slots.release)
+    return response
+
+# Live update streams. The dashboards open them on their own, so they are no
+# user activity: the idle check runs, but they don't keep the session alive
+# and get no access log line (a poll every EVENTS_POLL_INTERVAL seconds)
+BACKGROUND_ENDPOINTS = {'department_events', 'citizen_events'}
+
+@app.route('/events/department')
+@department_login_required
+def department_events():
+    department_id = session['department_id']
+    return event_stream_response(events.department_channel(department_id),
+                                 lambda cursor: poll_events(cursor, department_id=department_id))
+
+@app.route('/events/citizen')
+@citizen_login_required
+def citizen_events():
+    citizen_id = session['citizen_id']
+    return event_stream_response(events.citizen_channel(citizen_id),
+                                 lambda cursor: poll_events(cursor, citizen_id=citizen_id))
+
+def complaints_near(department_id, latitude, longitude, radius_km):
+    """
+    The department's complaints within radius_km of a point, nearest first
+
+    Candidates come from geohash prefix scans on the indexed column; only
+    those are checked with the exact distance.
+
+    Returns:
+        list: (distance in km, complaint) tuples
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    candidates = Complaint.query.filter(
+        Complaint.department_id == department_id,
+        or_(*[Complaint.geohash.like(cell + '%') for cell in cells])
+    )
+
+    nearby = []
+    for complaint in candidates:
+        distance = distance_km(latitude, longitude, complaint.latitude, complaint.longitude)
+        if distance <= radius_km:
+            nearby.append((distance, complaint))
+    return sorted(nearby, key=lambda item: item[0])
 
-    return render_template('department_dashboard.html',
-                         department_name=department.name,
-                         complaints=complaints,
-                         selected_status=status)
+def department_hotspots(department_id, since, precision=6, limit=5):
+    """
+    Places with the most complaints for the department since a date
+
+    Complaints are grouped by geohash cell (precision 6 is about 1 km) or,
+    without coordinates, by place key. The time window is an index range
+    scan on (department_id, date_submitted).
+
+    Returns:
+        list: dicts with 'hotspot', 'complaints' and the cell center
+            'latitude'/'longitude' (None for place keys)
+    """
+    # Cells and place keys are told apart by is_cell, never by the key itself
+    # (a place key like "center" is also a valid geohash)
+    is_cell = case((Complaint.geohash.isnot(None), 1), else_=0)
+    hotspot = func.coalesce(func.substr(Complaint.geohash, 1, precision), Complaint.location_key)
+    rows = db.session.query(
+        is_cell.label('is_cell'), hotspot.label('hotspot'), func.count(Complaint.complaint_id).label('complaints')
+    ).filter(
+        Complaint.department_id == department_id,
+        Complaint.date_submitted >= since,
+        hotspot.isnot(None)
+    ).group_by(is_cell, hotspot).order_by(func.count(Complaint.complaint_id).desc()).limit(limit).all()
+
+    hotspots = []
+    for cell, key, count in rows:
+        latitude = longitude = None
+        if cell:
+            latitude, longitude = decode_geohash(key)
+        hotspots.append({'hotspot': key, 'complaints': count, 'latitude': latitude, 'longitude': longitude})
+    return hotspots
+
+@app.route('/api/complaints/nearby')
+def api_complaints_nearby():
+    """
+    Query: lat, lon and radius_km (default 1)
+    """
+    if 'department_id' not in session:
+        return jsonify({'error': 'Please login to access this page'}), 401
+
+    try:
+        latitude = float(request.args['lat'])
+        longitude = float(request.args['lon'])
+        radius_km = float(request.args.get('radius_km', 1))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lon are required numbers'}), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius_km <= 50):
+        return jsonify({'error': 'Coordinates or radius out of range'}), 400
+
+    nearby = complaints_near(session['department_id'], latitude, longitude, radius_km)
+    return jsonify([{
+        'complaint_id': complaint.complaint_id,
+        'distance_km': round(distance, 3),
+        'latitude': complaint.latitude,
+        'longitude': complaint.longitude,
+        'priority': complaint.priority,
+        'date_submitted': complaint.date_submitted.isoformat() if complaint.date_submitted else None
+    } for distance, complaint in nearby])
+
+@app.route('/api/hotspots')
+def api_hotspots():
+    """
+    Query: days (default 7), precision (geohash characters, default 6), limit (default 10)
+    """
+    if 'department_id' not in session:
+        return jsonify({'error': 'Please login to access this page'}), 401
+
+    days = request.args.get('days', 7, type=int)
+    precision = min(max(request.args.get('precision', 6, type=int), 1), 9)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    since = date.today() - timedelta(days=days)
+    return jsonify(department_hotspots(session['department_id'], since, precision, limit))
 
 # Update Complaint Status Route
 @app.route('/update-complaint-status/<int:complaint_id>', methods=['POST'])
@@ -380,8 +929,7 @@ def update_complaint_status(complaint_id):
         remarks = request.form.get('remarks')
 
         # Validate status
-        valid_statuses = ['In-progress', 'Resolved', 'Not resolved']
-        if status not in valid_statuses:
+        if status not in VALID_STATUSES:
             flash('Invalid status value', 'error')
             return redirect(url_for('department_dashboard'))
 
@@ -401,6 +949,9 @@ def update_complaint_status(complaint_id):
         db.session.add(log)
         db.session.commit()
 
+        events.publish_complaint_event('status', complaint_id, complaint.department_id,
+                                       complaint.citizen_id, status=status)
+
         flash('Status updated successfully', 'success')
         return redirect(url_for('department_dashboard'))
 
@@ -409,6 +960,125 @@ def update_complaint_status(complaint_id):
         flash(f'Error updating status: {str(e)}', 'error')
         return redirect(url_for('department_dashboard'))
 
+def parse_complaint_ids(values):
+    """
+    Converts submitted complaint IDs to a de-duplicated list of ints,
+    or None if any of them is not a number
+    """
+    try:
+        return list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        return None
+
+def bulk_update_status(department_id, complaint_ids, status, remarks):
+    """
+    Logs the same status update for many complaints in one transaction
+
+    Ownership of all complaints is checked with a single query and the
+    ComplaintLog rows are written with one bulk insert.
+
+    Args:
+        department_id (int): Department making the update
+        complaint_ids (list): Complaint IDs to update
+        status (str): One of VALID_STATUSES
+        remarks (str): Remarks stored on every log entry
+
+    Returns:
+        tuple: (number of complaints updated, IDs not owned by the department)
+    """
+    owned = {
+        row.complaint_id: row.citizen_id
+        for row in db.session.query(Complaint.complaint_id, Complaint.citizen_id).filter(
+            Complaint.department_id == department_id,
+            Complaint.complaint_id.in_(complaint_ids)
+        )
+    }
+    not_owned = [complaint_id for complaint_id in complaint_ids if complaint_id not in owned]
+    if not_owned:
+        return 0, not_owned
+
+    now = datetime.now()
+    db.session.execute(ComplaintLog.__table__.insert(), [
+        {'complaint_id': complaint_id, 'status': status, 'remarks': remarks, 'timestamp': now}
+        for complaint_id in complaint_ids
+    ])
+    db.session.commit()
+
+    for complaint_id in complaint_ids:
+        events.publish_complaint_event('status', complaint_id, department_id, owned[complaint_id], status=status)
+    return len(complaint_ids), []
+
+def validate_bulk_update(complaint_ids, status, remarks):
+    """
+    Returns an error message for an invalid bulk update, None if it is valid
+    """
+    if complaint_ids is None:
+        return 'Invalid complaint IDs'
+    if not complaint_ids:
+        return 'Please select at least one complaint'
+    if len(complaint_ids) > MAX_BULK_UPDATE:
+        return f'At most {MAX_BULK_UPDATE} complaints can be updated at once'
+    if status not in VALID_STATUSES:
+        return 'Invalid status value'
+    if not remarks or len(remarks.strip()) < 5:
+        return 'Please provide meaningful remarks'
+    return None
+
+# Bulk Status Update Routes
+@app.route('/bulk-update-complaint-status', methods=['POST'])
+@department_login_required
+def bulk_update_complaint_status():
+    complaint_ids = parse_complaint_ids(request.form.getlist('complaint_ids'))
+    status = request.form.get('status')
+    remarks = request.form.get('remarks')
+
+    error = validate_bulk_update(complaint_ids, status, remarks)
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('department_dashboard'))
+
+    try:
+        updated, not_owned = bulk_update_status(session['department_id'], complaint_ids, status, remarks)
+        if not_owned:
+            flash('Unauthorized access', 'error')
+            return redirect(url_for('department_dashboard'))
+
+        flash(f'Status updated for {updated} complaints', 'success')
+        return redirect(url_for('department_dashboard'))
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error updating status: {str(e)}', 'error')
+        return redirect(url_for('department_dashboard'))
+
+@app.route('/api/complaints/status', methods=['POST'])
+def api_bulk_update_complaint_status():
+    """
+    JSON body: {"complaint_ids": [1, 2, 3], "status": "Resolved", "remarks": "..."}
+    """
+    if 'department_id' not in session:
+        return jsonify({'error': 'Please login to access this page'}), 401
+
+    data = request.get_json(silent=True) or {}
+    complaint_ids = data.get('complaint_ids')
+    complaint_ids = parse_complaint_ids(complaint_ids) if isinstance(complaint_ids, list) else None
+    status = data.get('status')
+    remarks = data.get('remarks')
+
+    error = validate_bulk_update(complaint_ids, status, remarks)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        updated, not_owned = bulk_update_status(session['department_id'], complaint_ids, status, remarks)
+        if not_owned:
+            return jsonify({'error': 'Unauthorized access', 'complaint_ids': not_owned}), 403
+        return jsonify({'updated': updated, 'status': status})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error updating status: {str(e)}'}), 500
+
 # Feedback Routes
 @app.route('/feedback-form/<int:complaint_id>')
 @citizen_login_required
@@ -472,6 +1142,18 @@ def logout():
     flash('You have been logged out successfully', 'success')
     return redirect(url_for('index'))
 
+# Admission counters (admitted, queued, shed) for tuning the pool sizes
+@app.route('/admission-stats')
+@stats_token_required
+def admission_stats_view():
+    return jsonify(admission_stats(app))
+
+# Latency and agreement of the live and candidate NLP engines in shadow mode
+@app.route('/shadow-stats')
+@stats_token_required
+def shadow_stats_view():
+    return jsonify(shadow.recorder.report())
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -482,17 +1164,90 @@ def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
+# Registered before the session check, which can end the request early
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    if (app.config['LOG_REQUESTS'] and request.endpoint != 'static'
+            and request.endpoint not in BACKGROUND_ENDPOINTS and app.logger.isEnabledFor(logging.INFO)):
+        duration_ms = round((time.perf_counter() - g.request_start) * 1000, 2)
+        app.logger.info("%s %s %s %sms", request.method, request.path, response.status_code, duration_ms,
+                        extra={'endpoint': request.endpoint, 'status': response.status_code,
+                               'duration_ms': duration_ms})
+    return response
+
 # Add session protection
 @app.before_request
 def before_request():
-    if 'last_activity' in session:
-        # Session timeout after 30 minutes of inactivity
-        last_activity = datetime.fromtimestamp(session['last_activity'])
-        if datetime.now() - last_activity > timedelta(minutes=30):
-            session.clear()
-            flash('Session expired. Please login again.', 'warning')
-            return redirect(url_for('index'))
-    session['last_activity'] = datetime.now().timestamp()
+    # Only logged-in sessions are tracked; static files never touch the session
+    if request.endpoint == 'static' or 'last_activity' not in session:
+        return
+
+    now = datetime.now().timestamp()
+    idle = now - session['last_activity']
+    if idle > app.config['SESSION_IDLE_TIMEOUT'].total_seconds():
+        session.clear()
+        flash('Session expired. Please login again.', 'warning')
+        return redirect(url_for('index'))
+
+    # Every write re-signs and re-sends the session cookie (or rewrites the
+    # stored session), so the timestamp is refreshed once per interval only
+    if idle >= app.config['SESSION_TOUCH_INTERVAL'] and request.endpoint not in BACKGROUND_ENDPOINTS:
+        session['last_activity'] = now
+
+def preload_app():
+    """
+    Loads everything the workers share before the server forks:
+    - NLTK stopwords, lemmatizer/WordNet and the VADER lexicon, or the
+      memory-mapped NLP artifact when one has been built
+    - Jinja templates
+    Then moves all surviving objects into the permanent GC generation, so the
+    collector in the workers never writes to (and un-shares) their pages.
+    """
+    load_resources()
+    for template in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template)
+    gc.collect()
+    gc.freeze()
+
+def configure_app(config=None, preload=False):
+    """
+    Configures the module-level app and initializes its extensions. The
+    routes are registered on that one app at import, so this is not a
+    factory: every call returns the same app, and the extensions are only
+    initialized on the first.
+
+    Args:
+        config (dict): Optional overrides applied to app.config
+        preload (bool): Load and freeze the NLP resources in this process,
+            e.g. in the gunicorn master before the workers are forked
+
+    Returns:
+        Flask: The module-level app
+    """
+    if config:
+        app.config.update(config)
+
+    log_pipeline.configure(app)
+    profiler.install(app)
+
+    if app.config['SESSION_STORE'] == 'db':
+        app.session_interface = DatabaseSessionInterface(db, StoredSession)
+
+    if 'sqlalchemy' not in app.extensions:
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            # Never hand pooled connections from the master to forked workers
+            db.engine.dispose()
+
+    if preload:
+        preload_app()
+
+    return app
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5001) 
\ No newline at end of file
+    configure_app().run(debug=True, port=5001) 
\ No newline at end of file
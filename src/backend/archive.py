@@ -0,0 +1,162 @@
+# archive.py
+#
+# Moves resolved complaints older than ARCHIVE_AFTER_DAYS, with their logs,
+# escalations and feedback, from the hot tables into the archive tables. Work
+# is done in batches of complaint IDs; each batch is copied and deleted in its
+# own transaction, so an interrupted run loses nothing and a rerun simply picks
+# up the complaints that are still eligible. Their complaint_terms rows are
+# only deleted, archived complaints are never reclassified.
+#
+# The archive tables keep the IDs of the hot tables, so an ID must never be
+# handed out again once its row was archived. MySQL 5.7 resets the
+# AUTO_INCREMENT counter to the highest ID left after a restart, and SQLite
+# without AUTOINCREMENT always uses it: a complaint that owns the highest ID
+# of complaints, complaint_log, complaint_escalations or feedback is therefore
+# held back as the high-water mark, and archived by a later run once newer
+# rows exist.
+#
+# Usage: python archive.py [--older-than-days N] [--batch-size N] [--dry-run]
+
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, literal, select
+
+from app import (app, configure_app, db, Complaint, ComplaintEscalation, ComplaintLog, ComplaintTerm, Feedback,
+                 ArchivedComplaint, ArchivedComplaintEscalation, ArchivedComplaintLog, ArchivedFeedback)
+
+def archivable_complaint_ids(cutoff, after_id=0, limit=500):
+    """
+    Finds complaints whose latest status is 'Resolved' and was set before cutoff
+
+    Args:
+        cutoff (datetime): Only complaints resolved before this are returned
+        after_id (int): Keyset position, only IDs greater than this are returned
+        limit (int): Maximum number of IDs
+
+    Returns:
+        list: Complaint IDs in ascending order
+    """
+    # Latest log by log_id, as everywhere else; one lookup per complaint on
+    # ix_complaint_log_complaint_log instead of aggregating the whole table
+    latest_log_id = select(func.max(ComplaintLog.log_id)).where(
+        ComplaintLog.complaint_id == Complaint.complaint_id
+    ).correlate(Complaint).scalar_subquery()
+
+    rows = db.session.query(Complaint.complaint_id).join(
+        ComplaintLog, ComplaintLog.log_id == latest_log_id
+    ).filter(
+        Complaint.complaint_id > after_id,
+        ComplaintLog.status == 'Resolved',
+        ComplaintLog.timestamp < cutoff
+    ).order_by(Complaint.complaint_id).limit(limit)
+
+    return [row.complaint_id for row in rows]
+
+def copy_rows(source, target, complaint_ids, extra=None):
+    """
+    INSERT ... SELECT the rows of complaint_ids from source into target,
+    so the data never travels through Python
+    """
+    columns = [column.name for column in source.__table__.columns]
+    selected = [source.__table__.c[name] for name in columns]
+    for name, value in (extra or {}).items():
+        columns.append(name)
+        selected.append(literal(value))
+
+    query = select(*selected).where(source.__table__.c.complaint_id.in_(complaint_ids))
+    db.session.execute(target.__table__.insert().from_select(columns, query))
+
+def high_water_complaint_ids():
+    """
+    Complaints that own the highest ID of one of the archived hot tables
+
+    Returns:
+        set: Complaint IDs that must stay in the hot tables for now
+    """
+    complaint_ids = set()
+    for model, key in ((Complaint, Complaint.complaint_id), (ComplaintLog, ComplaintLog.log_id),
+                       (ComplaintEscalation, ComplaintEscalation.escalation_id),
+                       (Feedback, Feedback.feedback_id)):
+        row = db.session.query(model.complaint_id).filter(
+            key == select(func.max(key)).scalar_subquery()
+        ).first()
+        if row is not None:
+            complaint_ids.add(row.complaint_id)
+    return complaint_ids
+
+def archive_batch(complaint_ids, archived_at):
+    """
+    Moves one batch of complaints and their logs, escalations and feedback to
+    the archive tables in a single transaction, except for the high-water
+    complaints
+
+    Returns:
+        list: IDs of the complaints archived
+    """
+    try:
+        held = high_water_complaint_ids()
+        complaint_ids = [complaint_id for complaint_id in complaint_ids if complaint_id not in held]
+        if not complaint_ids:
+            db.session.rollback()
+            return complaint_ids
+
+        copy_rows(Complaint, ArchivedComplaint, complaint_ids, {'archived_at': archived_at})
+        copy_rows(ComplaintLog, ArchivedComplaintLog, complaint_ids)
+        copy_rows(ComplaintEscalation, ArchivedComplaintEscalation, complaint_ids)
+        copy_rows(Feedback, ArchivedFeedback, complaint_ids)
+
+        for model in (ComplaintTerm, Feedback, ComplaintEscalation, ComplaintLog, Complaint):
+            db.session.execute(
+                model.__table__.delete().where(model.__table__.c.complaint_id.in_(complaint_ids))
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return complaint_ids
+
+def archive_resolved_complaints(older_than_days=None, batch_size=None, dry_run=False):
+    """
+    Archives all eligible complaints, one batch at a time
+
+    Args:
+        older_than_days (int): Minimum age of the resolution, default ARCHIVE_AFTER_DAYS
+        batch_size (int): Complaints per transaction, default ARCHIVE_BATCH_SIZE
+        dry_run (bool): Only count the eligible complaints
+
+    Returns:
+        dict: Number of complaints archived and batches committed
+    """
+    older_than_days = older_than_days or app.config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    archived = 0
+    batches = 0
+    after_id = 0
+    while True:
+        complaint_ids = archivable_complaint_ids(cutoff, after_id, batch_size)
+        if not complaint_ids:
+            break
+
+        after_id = complaint_ids[-1]
+        if not dry_run:
+            complaint_ids = archive_batch(complaint_ids, datetime.now())
+            batches += 1
+        archived += len(complaint_ids)
+        print(f"{'Found' if dry_run else 'Archived'} {archived} complaints (up to #{after_id})")
+
+    return {'archived': archived, 'batches': batches, 'cutoff': cutoff}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Archive old resolved complaints')
+    parser.add_argument('--older-than-days', type=int, help='Minimum age of the resolution in days')
+    parser.add_argument('--batch-size', type=int, help='Complaints moved per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Only count eligible complaints')
+    args = parser.parse_args()
+
+    with configure_app().app_context():
+        result = archive_resolved_complaints(args.older_than_days, args.batch_size, args.dry_run)
+    print(f"Done: {result['archived']} complaints resolved before {result['cutoff']:%Y-%m-%d}, "
+          f"{result['batches']} batches")
@@ -0,0 +1,198 @@
+# batch_sentiment.py
+#
+# Array-based sentiment scoring for batches of complaints. The VADER lexicon is
+# loaded once into a token -> id map and a NumPy weight array, so a whole batch
+# is scored with a few array operations instead of a Python loop per token.
+#
+# Agreement report against VADER: python batch_sentiment.py <complaints.txt>
+
+import string
+import sys
+from collections import Counter
+
+import numpy as np
+
+# VADER's normalization constant for the compound score
+ALPHA = 15
+
+def sentiment_priority(compound):
+    """
+    Maps a VADER-style compound score to a complaint priority
+    """
+    if compound == 0.0:
+        return "LOW"
+    elif compound < -0.5:
+        return "HIGH"
+    elif -0.5 <= compound <= 0.5:
+        return "MEDIUM"
+    else:
+        return "LOW"
+
+def tokenize(text):
+    """
+    Splits text into lowercase tokens the way VADER looks them up:
+    on whitespace, with surrounding punctuation stripped
+    """
+    tokens = []
+    for word in text.lower().split():
+        stripped = word.strip(string.punctuation)
+        # Keep emoticons such as ":(" which are lexicon entries themselves
+        tokens.append(stripped if len(stripped) > 1 else word)
+    return tokens
+
+class LexiconScorer:
+    """
+    Scores tokenized texts against a sentiment lexicon with NumPy.
+
+    Every token contributes its lexicon valence; the scores are combined like
+    VADER does (compound normalization, pos/neg/neu proportions), but without
+    VADER's negation, booster word and capitalization rules.
+    """
+
+    def __init__(self, lexicon):
+        """
+        Args:
+            lexicon (dict): token -> valence, e.g. SentimentIntensityAnalyzer().lexicon
+        """
+        self.token_ids = {token: i for i, token in enumerate(lexicon)}
+        # Id len(lexicon) is reserved for unknown tokens and has valence 0
+        self.weights = np.zeros(len(lexicon) + 1, dtype=np.float64)
+        self.weights[:len(lexicon)] = list(lexicon.values())
+        self.unknown_id = len(lexicon)
+
+    def encode(self, token_lists):
+        """
+        Flattens a batch of token lists into token ids and document indices
+        """
+        lookup = self.token_ids.get
+        unknown = self.unknown_id
+        ids = np.fromiter(
+            (lookup(token, unknown) for tokens in token_lists for token in tokens),
+            dtype=np.int64
+        )
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64,
+                              count=len(token_lists))
+        doc_index = np.repeat(np.arange(len(token_lists)), lengths)
+        return ids, doc_index
+
+    def score_batch(self, token_lists):
+        """
+        Scores a batch of tokenized complaints
+
+        Args:
+            token_lists (list): List of token lists
+
+        Returns:
+            dict: NumPy arrays 'neg', 'neu', 'pos' and 'compound', one value per text
+        """
+        n = len(token_lists)
+        ids, doc_index = self.encode(token_lists)
+        valence = self.weights[ids]
+
+        total = np.bincount(doc_index, weights=valence, minlength=n)
+        compound = total / np.sqrt(total * total + ALPHA)
+        compound = np.round(np.clip(compound, -1.0, 1.0), 4)
+
+        # Like VADER, sentiment words count one extra point towards pos/neg
+        pos_sum = np.bincount(doc_index, weights=np.where(valence > 0, valence + 1, 0), minlength=n)
+        neg_sum = np.bincount(doc_index, weights=np.where(valence < 0, valence - 1, 0), minlength=n)
+        neu_count = np.bincount(doc_index, weights=(valence == 0), minlength=n)
+        denominator = pos_sum + np.abs(neg_sum) + neu_count
+        denominator[denominator == 0] = 1
+
+        return {
+            'neg': np.round(np.abs(neg_sum / denominator), 3),
+            'neu': np.round(neu_count / denominator, 3),
+            'pos': np.round(pos_sum / denominator, 3),
+            'compound': compound
+        }
+
+    def priorities(self, compound):
+        """
+        Vectorized sentiment_priority for an array of compound scores
+        """
+        return np.select(
+            [compound == 0.0, compound < -0.5, compound <= 0.5],
+            ["LOW", "HIGH", "MEDIUM"],
+            default="LOW"
+        )
+
+    def analyze_batch(self, texts):
+        """
+        Scores raw texts, returning (sentiment dict, priority) per text like
+        nlp.analyze_sentiment
+        """
+        scores = self.score_batch([tokenize(text) for text in texts])
+        priorities = self.priorities(scores['compound'])
+        results = []
+        for i, priority in enumerate(priorities):
+            sentiment = {key: float(values[i]) for key, values in scores.items()}
+            results.append((sentiment, str(priority)))
+        return results
+
+def agreement_report(texts, sia, scorer):
+    """
+    Compares the lexicon scorer with VADER on the same texts
+
+    Args:
+        texts (list): Complaint texts
+        sia: nltk SentimentIntensityAnalyzer
+        scorer (LexiconScorer): Scorer built from the same lexicon
+
+    Returns:
+        dict: Priority agreement rate, compound score error, confusion counts
+            and the disagreeing texts
+    """
+    batch = scorer.analyze_batch(texts)
+    confusion = Counter()
+    disagreements = []
+    errors = []
+    for text, (sentiment, priority) in zip(texts, batch):
+        vader = sia.polarity_scores(text)
+        vader_priority = sentiment_priority(vader['compound'])
+        confusion[(vader_priority, priority)] += 1
+        errors.append(abs(vader['compound'] - sentiment['compound']))
+        if vader_priority != priority:
+            disagreements.append({
+                'text': text,
+                'vader': vader['compound'],
+                'lexicon': sentiment['compound'],
+                'vader_priority': vader_priority,
+                'lexicon_priority': priority
+            })
+
+    agreed = len(texts) - len(disagreements)
+    return {
+        'total': len(texts),
+        'agreement': agreed / len(texts) if texts else 1.0,
+        'mean_abs_error': sum(errors) / len(errors) if errors else 0.0,
+        'max_abs_error': max(errors, default=0.0),
+        'confusion': dict(confusion),
+        'disagreements': disagreements
+    }
+
+def print_report(report):
+    print(f"Texts: {report['total']}")
+    print(f"Priority agreement: {100 * report['agreement']:.2f}%")
+    print(f"Compound |error|: mean {report['mean_abs_error']:.4f}, max {report['max_abs_error']:.4f}")
+    print("\nConfusion (VADER -> lexicon):")
+    for (vader, lexicon), count in sorted(report['confusion'].items()):
+        print(f"  {vader:>6} -> {lexicon:<6} {count}")
+    if report['disagreements']:
+        print("\nDisagreements:")
+        for row in report['disagreements'][:20]:
+            print(f"  {row['vader']:+.4f} ({row['vader_priority']}) vs "
+                  f"{row['lexicon']:+.4f} ({row['lexicon_priority']}): {row['text'][:80]}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python batch_sentiment.py <complaints.txt>  (one complaint per line)")
+        sys.exit(1)
+
+    from nlp import load_resources
+
+    with open(sys.argv[1], encoding='utf-8') as f:
+        complaints = [line.strip() for line in f if line.strip()]
+
+    resources = load_resources()
+    print_report(agreement_report(complaints, resources['sia'], LexiconScorer(resources['sia'].lexicon)))
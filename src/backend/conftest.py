@@ -0,0 +1,37 @@
+# conftest.py
+#
+# pytest fixtures: the app configured once against a temporary SQLite
+# database, and empty tables for every test.
+#
+# Usage: python -m pytest -q
+
+import pytest
+
+import app as backend
+
+@pytest.fixture(scope='session')
+def flask_app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('db') / 'test.db'
+    return backend.configure_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'LOG_FILE': None,
+        'SESSION_COOKIE_SECURE': False,
+        'ADMISSION_CONTROL_ENABLED': False
+    })
+
+@pytest.fixture
+def database(flask_app):
+    with flask_app.app_context():
+        backend.db.drop_all()
+        backend.db.create_all()
+        yield backend.db
+        backend.db.session.remove()
+
+@pytest.fixture
+def citizen(database):
+    citizen = backend.Citizen(name='Test Citizen', contact_number='9000000001', email='citizen@example.com')
+    department = backend.Department(name='General', contact_number='9000000002', email='general@example.com')
+    database.session.add_all([citizen, department])
+    database.session.commit()
+    return citizen
@@ -0,0 +1,64 @@
+# dashboard_cache.py
+#
+# Conditional GET and rendered-HTML caching for the department dashboard.
+#
+# The ETag is a hash of the department's data version: the count and highest
+# ID of its complaints and complaint logs, the sum of the complaints'
+# revisions (plus the archive when history is shown), computed with two
+# aggregate queries. An unchanged reload is answered
+# with 304, or with the cached page if the browser didn't send the ETag. When
+# something did change, only the cards whose complaint changed are rendered
+# again; the others come from the per-card fragment cache. A card's key holds
+# everything it shows that can change: priority, category, latest log and
+# the citizen's name and contact number.
+
+import hashlib
+
+from flask import current_app, make_response, render_template
+from markupsafe import Markup
+
+from identity_cache import TTLCache
+
+DEFAULT_TTL = 300
+
+_pages = TTLCache(max_size=1000)
+_cards = TTLCache(max_size=50000)
+
+def _ttl():
+    return current_app.config.get('DASHBOARD_CACHE_TTL', DEFAULT_TTL)
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def cached_page(etag):
+    return _pages.get(etag)
+
+def cache_page(etag, html):
+    _pages.set(etag, html, _ttl())
+
+def cached_card(key):
+    return _cards.get(key)
+
+def render_card(key, complaint):
+    """
+    Renders the card of a complaint and caches it under key, which must
+    change whenever the card content does
+    """
+    card = Markup(render_template('complaint_card.html', complaint=complaint))
+    _cards.set(key, card, _ttl())
+    return card
+
+def etag_response(html, etag):
+    """
+    Wraps the page in a response browsers must revalidate with If-None-Match
+    """
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
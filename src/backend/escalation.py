@@ -0,0 +1,165 @@
+# escalation.py
+#
+# Moves open complaints that have gone without a status update for longer than
+# their SLA window up one priority (LOW -> MEDIUM -> HIGH) and records why.
+#
+# Windows come from ESCALATION_SLA_DAYS, overridden per department by
+# ESCALATION_DEPARTMENT_SLA_DAYS. Each (department, priority) pair is one range
+# scan on ix_complaints_department_date, walked in keyset batches of
+# ESCALATION_BATCH_SIZE; every batch is one locking SELECT of the complaints
+# still at that priority, one UPDATE and one bulk ComplaintEscalation insert
+# of those, and one commit, so memory stays bounded by the batch size.
+#
+# Escalations are kept in complaint_escalations, not in the status log, so the
+# status citizens and departments see (Pending for a complaint nobody has
+# updated yet) never changes. The latest escalation restarts the SLA clock
+# like a status update: a rerun finds nothing to do until another full window
+# of the new priority has passed. The UPDATE bumps Complaint.revision, which
+# the department dashboard's data version includes. Meant to run from cron,
+# e.g. hourly.
+#
+# Usage: python escalation.py [--batch-size N] [--dry-run]
+
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select
+
+from app import app, configure_app, db, Complaint, ComplaintEscalation, ComplaintLog, Department
+
+# Priority a complaint is escalated to; HIGH is the last step
+NEXT_PRIORITY = {'LOW': 'MEDIUM', 'MEDIUM': 'HIGH'}
+
+def sla_days(department_id):
+    """
+    SLA window in days per escalatable priority for a department
+    """
+    windows = dict(app.config['ESCALATION_SLA_DAYS'])
+    windows.update(app.config['ESCALATION_DEPARTMENT_SLA_DAYS'].get(department_id, {}))
+    return {priority: days for priority, days in windows.items() if priority in NEXT_PRIORITY and days}
+
+def overdue_complaints(department_id, priority, cutoff, after_id=0, limit=500):
+    """
+    Finds open complaints of a department and priority whose last status
+    update and last escalation (or submission, if there was neither) are
+    older than cutoff
+
+    Args:
+        cutoff (datetime): Complaints updated at or after this are not overdue
+        after_id (int): Keyset position, only IDs greater than this are returned
+        limit (int): Maximum number of complaints
+
+    Returns:
+        list: Complaint IDs in ascending order
+    """
+    latest_log_id = select(func.max(ComplaintLog.log_id)).where(
+        ComplaintLog.complaint_id == Complaint.complaint_id
+    ).correlate(Complaint).scalar_subquery()
+    latest_escalation = select(func.max(ComplaintEscalation.timestamp)).where(
+        ComplaintEscalation.complaint_id == Complaint.complaint_id
+    ).correlate(Complaint).scalar_subquery()
+
+    rows = db.session.query(Complaint.complaint_id).outerjoin(
+        ComplaintLog, ComplaintLog.log_id == latest_log_id
+    ).filter(
+        Complaint.department_id == department_id,
+        Complaint.date_submitted < cutoff.date(),
+        Complaint.priority == priority,
+        Complaint.complaint_id > after_id,
+        or_(ComplaintLog.log_id.is_(None),
+            and_(ComplaintLog.status != 'Resolved', ComplaintLog.timestamp < cutoff)),
+        or_(latest_escalation.is_(None), latest_escalation < cutoff)
+    ).order_by(Complaint.complaint_id).limit(limit)
+
+    return [row.complaint_id for row in rows]
+
+def escalate_batch(complaint_ids, priority, days, now):
+    """
+    Raises the priority of one batch of complaints and records the
+    escalation, in a single transaction; the status log is left alone
+
+    Complaints whose priority is no longer the given one (changed since
+    they were found) are skipped and get no escalation record.
+
+    Returns:
+        list: IDs of the complaints escalated
+    """
+    new_priority = NEXT_PRIORITY[priority]
+    remarks = f'Escalated from {priority} to {new_priority}: no update for {days} days'
+    table = Complaint.__table__
+    try:
+        # Locked until the commit, so the UPDATE changes exactly these rows
+        complaint_ids = [row.complaint_id for row in db.session.execute(
+            select(table.c.complaint_id).where(
+                table.c.complaint_id.in_(complaint_ids),
+                table.c.priority == priority
+            ).with_for_update()
+        )]
+        if complaint_ids:
+            db.session.execute(
+                table.update().where(table.c.complaint_id.in_(complaint_ids)).values(
+                    priority=new_priority, revision=table.c.revision + 1
+                )
+            )
+            db.session.execute(ComplaintEscalation.__table__.insert(), [
+                {'complaint_id': complaint_id, 'old_priority': priority, 'new_priority': new_priority,
+                 'remarks': remarks, 'timestamp': now}
+                for complaint_id in complaint_ids
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return complaint_ids
+
+def escalate_overdue_complaints(batch_size=None, dry_run=False):
+    """
+    Escalates every overdue complaint, one batch at a time
+
+    Args:
+        batch_size (int): Complaints per transaction, default ESCALATION_BATCH_SIZE
+        dry_run (bool): Only count the overdue complaints
+
+    Returns:
+        dict: Number of complaints escalated per priority and batches committed
+    """
+    batch_size = batch_size or app.config['ESCALATION_BATCH_SIZE']
+    now = datetime.now()
+
+    escalated = {priority: 0 for priority in NEXT_PRIORITY}
+    batches = 0
+    department_ids = [row.department_id for row in db.session.query(Department.department_id)]
+    for department_id in department_ids:
+        # MEDIUM first, so complaints just raised from LOW are not looked at twice
+        for priority, days in sorted(sla_days(department_id).items(), key=lambda item: item[0] == 'LOW'):
+            cutoff = now - timedelta(days=days)
+            count = 0
+            after_id = 0
+            while True:
+                complaint_ids = overdue_complaints(department_id, priority, cutoff, after_id, batch_size)
+                if not complaint_ids:
+                    break
+
+                after_id = complaint_ids[-1]
+                if not dry_run:
+                    complaint_ids = escalate_batch(complaint_ids, priority, days, now)
+                    batches += 1
+                count += len(complaint_ids)
+            if count:
+                escalated[priority] += count
+                print(f"Department {department_id}: {'found' if dry_run else 'escalated'} "
+                      f"{count} {priority} complaints older than {days} days")
+
+    return {'escalated': escalated, 'batches': batches}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Escalate open complaints past their SLA window')
+    parser.add_argument('--batch-size', type=int, help='Complaints escalated per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Only count overdue complaints')
+    args = parser.parse_args()
+
+    with configure_app().app_context():
+        result = escalate_overdue_complaints(args.batch_size, args.dry_run)
+    summary = ', '.join(f'{count} {priority}' for priority, count in result['escalated'].items())
+    print(f"Done: {summary} complaints {'overdue' if args.dry_run else 'escalated'}, "
+          f"{result['batches']} batches")
@@ -0,0 +1,158 @@
+# events.py
+#
+# Live dashboard updates over server-sent events (SSE).
+#
+# Routes publish complaint events after their commit to an in-process broker
+# with one channel per department and per citizen ("department:3",
+# "citizen:42"); each open event stream is a subscriber queue. The broker only
+# reaches streams served by the same process, so with several workers set
+# EVENTS_MODE = 'poll' (gunicorn.conf.py does): every request then looks for
+# new complaints and logs in the database once and ends, and the browser's
+# EventSource reconnects after EVENTS_POLL_INTERVAL seconds, sending the
+# cursor back as Last-Event-ID. A poll holds a worker thread only for its
+# query.
+#
+# A 'pubsub' stream holds its worker thread until it ends after
+# EVENTS_MAX_STREAM_SECONDS, so at most EVENTS_MAX_STREAMS of them are open
+# per process; further ones are answered with 503 + Retry-After. EventSource
+# gives up on an error status, so the page opens a new one after
+# EVENTS_RETRY_AFTER seconds.
+
+import json
+import queue
+import threading
+import time
+
+# Events buffered per stream before new ones are dropped for that client
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Broker:
+    """
+    In-process publish/subscribe of events to channels
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client must not block the publishing request
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+broker = Broker()
+
+class StreamSlots:
+    """
+    Count of the streams open in this process, with a cap
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+stream_slots = StreamSlots()
+
+def department_channel(department_id):
+    return f'department:{department_id}'
+
+def citizen_channel(citizen_id):
+    return f'citizen:{citizen_id}'
+
+def publish_complaint_event(kind, complaint_id, department_id, citizen_id, **data):
+    """
+    Tells the department's and the citizen's open streams about a complaint
+
+    Args:
+        kind (str): 'created' or 'status'
+        data: Extra fields sent to the page, e.g. status or priority
+    """
+    event = dict(data, type=kind, complaint_id=complaint_id)
+    broker.publish(department_channel(department_id), event)
+    broker.publish(citizen_channel(citizen_id), event)
+
+def format_event(event, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('event: complaint')
+    lines.append(f'data: {json.dumps(event)}')
+    return '\n'.join(lines) + '\n\n'
+
+def pubsub_stream(channel, heartbeat, max_seconds):
+    """
+    Yields the SSE messages published to a channel
+    """
+    subscriber = broker.subscribe(channel)
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {int(heartbeat * 1000)}\n\n'
+        while time.monotonic() < deadline:
+            try:
+                yield format_event(subscriber.get(timeout=heartbeat))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(channel, subscriber)
+
+def polling_stream(poll, cursor, interval):
+    """
+    Yields the SSE messages for the events poll() finds in the database,
+    then ends; the browser reconnects after interval seconds
+
+    Args:
+        poll: Callable taking the cursor and returning (events, new cursor)
+        cursor (tuple): Highest (complaint_id, log_id) already seen
+    """
+    yield f'retry: {int(interval * 1000)}\n\n'
+    events, cursor = poll(cursor)
+    event_id = f'{cursor[0]}:{cursor[1]}'
+    for event in events:
+        yield format_event(event, event_id)
+    # Without events the cursor still has to reach the browser: an id field
+    # with no data sets Last-Event-ID without dispatching anything
+    yield f'id: {event_id}\n\n'
+
+def parse_cursor(last_event_id):
+    """
+    Reads the (complaint_id, log_id) cursor from a Last-Event-ID header
+    """
+    try:
+        complaint_id, log_id = last_event_id.split(':')
+        return int(complaint_id), int(log_id)
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,147 @@
+# geo.py
+#
+# Location handling for complaints: parsing the free-text location into
+# coordinates or a normalized place key, geohash encoding, and the geohash
+# cells covering a search radius.
+#
+# Complaints with coordinates store their geohash in an indexed column, so
+# "within R km of a point" becomes a few prefix (LIKE 'abc%') range scans on
+# that index followed by an exact distance check on the few rows returned.
+
+import math
+import re
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Characters stored per complaint; precision 9 cells are about 5 m wide
+GEOHASH_PRECISION = 9
+
+EARTH_RADIUS_KM = 6371.0
+
+# Upper bound on geohash cells used to cover one radius query
+MAX_COVER_CELLS = 16
+
+COORDINATES_PATTERN = re.compile(r'^\s*(-?\d{1,2}(?:\.\d+)?)\s*[,; ]\s*(-?\d{1,3}(?:\.\d+)?)\s*$')
+
+def parse_location(text):
+    """
+    Interprets the location entered with a complaint
+
+    Returns:
+        tuple: (latitude, longitude, place key); latitude and longitude are
+            None unless the text is a "lat, lon" pair, the place key is None
+            for empty text
+    """
+    if not text or not text.strip():
+        return None, None, None
+
+    match = COORDINATES_PATTERN.match(text)
+    if match:
+        latitude, longitude = float(match.group(1)), float(match.group(2))
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude, None
+
+    return None, None, normalize_place(text)
+
+def normalize_place(text):
+    """
+    Lowercase words without punctuation, so "MG Road," and "mg  road" match
+    """
+    return ' '.join(re.sub(r'[^a-z0-9\s]', ' ', text.lower()).split())[:100] or None
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    value = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            middle = (longitude_range[0] + longitude_range[1]) / 2
+            if longitude >= middle:
+                value = (value << 1) | 1
+                longitude_range[0] = middle
+            else:
+                value <<= 1
+                longitude_range[1] = middle
+        else:
+            middle = (latitude_range[0] + latitude_range[1]) / 2
+            if latitude >= middle:
+                value = (value << 1) | 1
+                latitude_range[0] = middle
+            else:
+                value <<= 1
+                latitude_range[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(geohash)
+
+def cell_size(precision):
+    """
+    Height and width of a geohash cell in degrees
+    """
+    bits = 5 * precision
+    longitude_bits = (bits + 1) // 2
+    latitude_bits = bits // 2
+    return 180.0 / (1 << latitude_bits), 360.0 / (1 << longitude_bits)
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    """
+    Great-circle (haversine) distance
+    """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle of radius_km
+    around the point, using the finest precision that needs at most
+    MAX_COVER_CELLS cells
+    """
+    d_latitude = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_latitude = max(math.cos(math.radians(latitude)), 1e-6)
+    d_longitude = min(180.0, d_latitude / cos_latitude)
+
+    south, north = max(-90.0, latitude - d_latitude), min(90.0, latitude + d_latitude)
+    west, east = longitude - d_longitude, longitude + d_longitude
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(north / height) - math.floor(south / height) + 1
+        columns = math.floor(east / width) - math.floor(west / width) + 1
+        if rows * columns <= MAX_COVER_CELLS or precision == 1:
+            break
+
+    cells = set()
+    for row in range(rows):
+        cell_latitude = min(north, south + row * height)
+        for column in range(columns):
+            cell_longitude = min(east, west + column * width)
+            # Wrap around the antimeridian
+            cell_longitude = (cell_longitude + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_latitude, cell_longitude, precision))
+    return sorted(cells)
+
+def decode_geohash(geohash):
+    """
+    Center of a geohash cell as (latitude, longitude)
+    """
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = longitude_range if even else latitude_range
+            target[1 - bit] = (target[0] + target[1]) / 2
+            even = not even
+    return (latitude_range[0] + latitude_range[1]) / 2, (longitude_range[0] + longitude_range[1]) / 2
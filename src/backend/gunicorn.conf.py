@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+#
+# Run with: gunicorn -c gunicorn.conf.py
+#
+# The app is built and the NLP resources are loaded once in the master
+# (preload_app), then frozen with gc.freeze() so the forked workers share
+# those pages copy-on-write. Check the saving with: python memreport.py <master_pid>
+
+import gc
+import os
+
+wsgi_app = "app:configure_app(preload=True)"
+# The in-process event broker can't reach other workers, and an open event
+# stream would hold one of the few threads of a worker: poll instead (events.py)
+os.environ.setdefault('EVENTS_MODE', 'poll')
+preload_app = True
+bind = os.environ.get('BIND', '127.0.0.1:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Threads per worker. Exported for app.py, which only enables admission
+# control (admission.py) with a known thread count and sizes the pools by it
+threads = int(os.environ.setdefault('WEB_THREADS', '4'))
+
+# gunicorn executes this file before it imports the app (with preload_app the
+# app is loaded while the arbiter is set up, before any server hook such as
+# on_starting runs), so collections are switched off here for the whole load;
+# the objects created meanwhile are frozen by preload_app() in app.py
+gc.disable()
+
+def when_ready(server):
+    # Runs in the master after the app was loaded and frozen, before the
+    # first worker is forked; the workers inherit the enabled collector
+    gc.enable()
@@ -0,0 +1,130 @@
+# identity_cache.py
+#
+# Per-process cache of the logged-in principals (Citizen / Department profile
+# data) and of the department ID -> name map, so page views don't query the
+# same rows on every request.
+#
+# Entries expire after IDENTITY_CACHE_TTL seconds and are dropped as soon as
+# this process writes the row (SQLAlchemy mapper events); the TTL bounds how
+# long other workers can serve a stale profile. Cached values are plain
+# snapshots of the column values, never ORM instances, so they can be shared
+# across sessions and threads.
+
+import threading
+import time
+from types import SimpleNamespace
+
+from flask import current_app, g
+from sqlalchemy import event
+
+DEFAULT_TTL = 60
+
+class TTLCache:
+    """
+    Thread-safe dict whose entries expire after a number of seconds
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # Drop expired entries first, then the oldest ones
+                now = time.monotonic()
+                for k in [k for k, entry in self._entries.items() if entry[1] < now]:
+                    del self._entries[k]
+                while len(self._entries) >= self.max_size:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (value, time.monotonic() + ttl)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+_cache = TTLCache()
+
+DEPARTMENT_NAMES_KEY = ('departments', 'names')
+
+def _ttl():
+    return current_app.config.get('IDENTITY_CACHE_TTL', DEFAULT_TTL)
+
+def _request_cache():
+    if 'identity_cache' not in g:
+        g.identity_cache = {}
+    return g.identity_cache
+
+def snapshot(row):
+    """
+    Copies the column values of a model instance into a plain object
+    """
+    return SimpleNamespace(**{column.name: getattr(row, column.name) for column in row.__table__.columns})
+
+def get_profile(model, primary_key):
+    """
+    Returns a snapshot of the row, or None if it does not exist
+
+    Looked up once per request, then in the process cache, then in the database.
+    """
+    key = (model.__tablename__, primary_key)
+    request_cache = _request_cache()
+    if key in request_cache:
+        return request_cache[key]
+
+    profile = _cache.get(key)
+    if profile is None:
+        row = model.query.get(primary_key)
+        profile = snapshot(row) if row else None
+        if profile is not None:
+            _cache.set(key, profile, _ttl())
+
+    request_cache[key] = profile
+    return profile
+
+def get_department_names(model):
+    """
+    Returns the department ID -> name map loaded from the departments table
+    """
+    names = _cache.get(DEPARTMENT_NAMES_KEY)
+    if names is None:
+        names = dict(model.query.with_entities(model.department_id, model.name).all())
+        _cache.set(DEPARTMENT_NAMES_KEY, names, _ttl())
+    return names
+
+def invalidate(model, primary_key):
+    _cache.invalidate((model.__tablename__, primary_key))
+    if model.__tablename__ == DEPARTMENT_NAMES_KEY[0]:
+        _cache.invalidate(DEPARTMENT_NAMES_KEY)
+
+def cache_stats():
+    return {'hits': _cache.hits, 'misses': _cache.misses}
+
+def register_models(*models):
+    """
+    Drops cached entries whenever this process inserts, updates or deletes
+    a row of one of the models
+    """
+    def on_write(mapper, connection, target):
+        model = type(target)
+        invalidate(model, mapper.primary_key_from_instance(target)[0])
+
+    for model in models:
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, on_write)
@@ -0,0 +1,413 @@
+# loadtest.py
+#
+# End-to-end load test of the Flask app against a seeded SQLite stand-in.
+#
+# Seeds citizens, departments, complaints and logs, then runs concurrent
+# simulated users issuing a mix of logins, complaint submissions, dashboard
+# views and status updates, either straight through the WSGI app (Flask test
+# client) or over HTTP against a local threaded server. Reports throughput,
+# latency percentiles, status codes and DB queries per route.
+#
+# Usage:
+#   python loadtest.py --citizens 1000 --complaints 20000 --users 16 --duration 30
+#   python loadtest.py --mode server --mix register_complaint=5,department_dashboard=1
+
+import argparse
+import http.cookiejar
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from geo import encode_geohash
+
+# Relative weights of the simulated actions
+DEFAULT_MIX = {
+    'login': 5,
+    'citizen_dashboard': 25,
+    'view_complaint': 10,
+    'register_complaint': 15,
+    'department_dashboard': 25,
+    'update_complaint_status': 20
+}
+
+DEPARTMENT_NAMES = ['Sanitation', 'Water', 'Infrastructure', 'Public Safety', 'General']
+
+SAMPLE_COMPLAINTS = [
+    "Garbage has not been collected on our street for two weeks and the bins are overflowing",
+    "There is a water leak from the main pipe near the school, water is wasted every day",
+    "Huge pothole on the main road, two bikes already had accidents, it is dangerous",
+    "Street light broken near the park, the area is unsafe at night and there was a theft",
+    "Drain is blocked and sewage is flowing onto the road",
+    "No water supply in our area since yesterday morning",
+    "The bridge railing is broken and children walk there every day",
+    "Please clean the public toilet near the bus stand, it is in terrible condition",
+    "Noise from construction late at night, please look into it",
+    "Stray dogs near the market are a concern for residents"
+]
+
+STATUSES = ['In-progress', 'Resolved', 'Not resolved']
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+def seed_database(db, models, citizens, departments, complaints, logs_per_complaint, seed=0):
+    """
+    Fills an empty database with bulk inserts
+
+    Args:
+        departments (int): At least len(DEPARTMENT_NAMES), the departments
+            nlp.py assigns new complaints to
+
+    Returns:
+        dict: 'citizens' and 'departments' IDs and credentials and the
+            complaint IDs per citizen and per department
+    """
+    if departments < len(DEPARTMENT_NAMES):
+        raise ValueError(f"At least {len(DEPARTMENT_NAMES)} departments are needed, got {departments}")
+    rng = random.Random(seed)
+
+    citizen_rows = [{
+        'citizen_id': i,
+        'name': f'Citizen {i}',
+        'contact_number': str(9000000000 + i),
+        'email': f'citizen{i}@example.com',
+        'address': f'{i} Main Street'
+    } for i in range(1, citizens + 1)]
+
+    department_rows = [{
+        'department_id': i,
+        'name': DEPARTMENT_NAMES[i - 1] if i <= len(DEPARTMENT_NAMES) else f'Department {i}',
+        'contact_person': f'Officer {i}',
+        'contact_number': str(8000000000 + i),
+        'email': f'department{i}@example.com',
+        'address': f'{i} Civic Centre'
+    } for i in range(1, departments + 1)]
+
+    today = datetime.now()
+    complaint_rows = []
+    log_rows = []
+    complaints_by_citizen = defaultdict(list)
+    complaints_by_department = defaultdict(list)
+    for i in range(1, complaints + 1):
+        department_id = rng.randint(1, departments)
+        citizen_id = rng.randint(1, citizens)
+        submitted = today - timedelta(days=rng.randint(0, 365))
+        # Scattered over a ~20 km wide city
+        latitude = 12.97 + rng.gauss(0, 0.05)
+        longitude = 77.59 + rng.gauss(0, 0.05)
+        complaint_rows.append({
+            'complaint_id': i,
+            'citizen_id': citizen_id,
+            'category': DEPARTMENT_NAMES[min(department_id, len(DEPARTMENT_NAMES)) - 1],
+            'description': rng.choice(SAMPLE_COMPLAINTS),
+            'department_id': department_id,
+            'priority': rng.choice(['LOW', 'MEDIUM', 'HIGH']),
+            'date_submitted': submitted.date(),
+            'location': f'{latitude:.5f}, {longitude:.5f}',
+            'latitude': latitude,
+            'longitude': longitude,
+            'geohash': encode_geohash(latitude, longitude)
+        })
+        complaints_by_citizen[citizen_id].append(i)
+        complaints_by_department[department_id].append(i)
+        for n in range(rng.randint(0, logs_per_complaint)):
+            log_rows.append({
+                'complaint_id': i,
+                'status': rng.choice(STATUSES),
+                'remarks': 'Seeded status update',
+                'timestamp': submitted + timedelta(days=n + 1)
+            })
+
+    for model, rows in ((models['Citizen'], citizen_rows),
+                        (models['Department'], department_rows),
+                        (models['Complaint'], complaint_rows),
+                        (models['ComplaintLog'], log_rows)):
+        for start in range(0, len(rows), 5000):
+            db.session.execute(model.__table__.insert(), rows[start:start + 5000])
+    db.session.commit()
+
+    return {
+        'citizens': [(row['citizen_id'], row['email'], row['contact_number']) for row in citizen_rows],
+        'departments': [(row['department_id'], row['email'], row['contact_number'])
+                        for row in department_rows],
+        'complaints_by_citizen': dict(complaints_by_citizen),
+        'complaints_by_department': dict(complaints_by_department),
+        'complaint_count': complaints
+    }
+
+class RouteStats:
+    """
+    Thread-safe latency, status code and query count samples per route
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+        self.query_counts = defaultdict(list)
+
+    def record_request(self, route, seconds, status_code):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            self.status_codes[route][status_code] += 1
+
+    def record_queries(self, endpoint, count):
+        with self._lock:
+            self.query_counts[endpoint].append(count)
+
+def instrument_app(app, db, stats):
+    """
+    Counts the SQL statements run by each request and records them per
+    endpoint when the response is sent
+    """
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.loadtest_queries = g.get('loadtest_queries', 0) + 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    def record(response):
+        stats.record_queries(request.endpoint or 'unknown', g.get('loadtest_queries', 0))
+        return response
+
+    app.after_request(record)
+
+class WSGIClient:
+    """
+    Simulated browser driving the app in-process through the Flask test client
+    """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data=data).status_code
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class HTTPClient:
+    """
+    Simulated browser talking HTTP to a server, keeping its own cookies
+    and not following redirects
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect
+        )
+
+    def _open(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, body) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def get(self, path):
+        return self._open(path)
+
+    def post(self, path, data):
+        return self._open(path, data)
+
+class SimulatedUser(threading.Thread):
+    """
+    One user session issuing weighted random actions until the deadline
+    """
+
+    def __init__(self, make_client, seed_data, mix, stats, deadline, seed):
+        super().__init__(daemon=True)
+        self.make_client = make_client
+        self.seed_data = seed_data
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.citizen = None
+        self.citizen_id = None
+        self.department = None
+        self.department_id = None
+
+    def timed(self, route, call, *args):
+        start = time.perf_counter()
+        status_code = call(*args)
+        self.stats.record_request(route, time.perf_counter() - start, status_code)
+        return status_code
+
+    def login_citizen(self):
+        self.citizen = self.make_client()
+        self.citizen_id, email, contact_number = self.rng.choice(self.seed_data['citizens'])
+        self.timed('citizen_login', self.citizen.post, '/citizen-login',
+                   {'email': email, 'contact_number': contact_number})
+
+    def login_department(self):
+        self.department = self.make_client()
+        self.department_id, email, contact_number = self.rng.choice(self.seed_data['departments'])
+        self.timed('department_login', self.department.post, '/department-login',
+                   {'email': email, 'contact_number': contact_number})
+
+    def run_action(self, action):
+        if action == 'login':
+            if self.rng.random() < 0.5:
+                self.login_citizen()
+            else:
+                self.login_department()
+            return
+
+        if action in ('citizen_dashboard', 'view_complaint', 'register_complaint') and not self.citizen:
+            self.login_citizen()
+        if action in ('department_dashboard', 'update_complaint_status') and not self.department:
+            self.login_department()
+
+        if action == 'citizen_dashboard':
+            self.timed(action, self.citizen.get, '/citizen-dashboard')
+        elif action == 'view_complaint':
+            # One of the citizen's own complaints; any other is redirected away
+            complaint_ids = self.seed_data['complaints_by_citizen'].get(self.citizen_id)
+            if not complaint_ids:
+                return
+            self.timed(action, self.citizen.get, f'/view-complaint/{self.rng.choice(complaint_ids)}')
+        elif action == 'register_complaint':
+            self.timed(action, self.citizen.post, '/register-complaint',
+                       {'description': self.rng.choice(SAMPLE_COMPLAINTS)})
+        elif action == 'department_dashboard':
+            self.timed(action, self.department.get, '/department-dashboard')
+        elif action == 'update_complaint_status':
+            complaint_ids = self.seed_data['complaints_by_department'].get(self.department_id)
+            if not complaint_ids:
+                return
+            self.timed(action, self.department.post,
+                       f'/update-complaint-status/{self.rng.choice(complaint_ids)}',
+                       {'status': self.rng.choice(STATUSES), 'remarks': 'Load test update'})
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            self.run_action(self.rng.choices(self.actions, self.weights)[0])
+
+def start_local_server(app):
+    """
+    Serves the app from a threaded werkzeug server on a free local port
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def print_report(stats, elapsed):
+    total = sum(len(values) for values in stats.latencies.values())
+    print(f"\n{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s\n")
+    print(f"{'route':<26}{'count':>7}{'req/s':>8}{'p50 ms':>9}{'p90 ms':>9}"
+          f"{'p99 ms':>9}{'max ms':>9}  status codes")
+    for route in sorted(stats.latencies):
+        values = stats.latencies[route]
+        codes = ' '.join(f'{code}:{n}' for code, n in sorted(stats.status_codes[route].items()))
+        print(f"{route:<26}{len(values):>7}{len(values) / elapsed:>8.1f}"
+              f"{1000 * percentile(values, 0.5):>9.1f}{1000 * percentile(values, 0.9):>9.1f}"
+              f"{1000 * percentile(values, 0.99):>9.1f}{1000 * max(values):>9.1f}  {codes}")
+
+    print(f"\n{'endpoint':<32}{'requests':>9}{'avg queries':>13}{'max queries':>13}")
+    for endpoint in sorted(stats.query_counts):
+        counts = stats.query_counts[endpoint]
+        print(f"{endpoint:<32}{len(counts):>9}{sum(counts) / len(counts):>13.1f}{max(counts):>13}")
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for item in text.split(','):
+            action, weight = item.split('=')
+            if action not in DEFAULT_MIX:
+                raise ValueError(f"Unknown action: {action}")
+            mix[action] = float(weight)
+    return {action: weight for action, weight in mix.items() if weight > 0}
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the complaint system')
+    parser.add_argument('--citizens', type=int, default=500)
+    parser.add_argument('--departments', type=int, default=len(DEPARTMENT_NAMES),
+                        help=f'At least {len(DEPARTMENT_NAMES)}, the departments the NLP assigns to')
+    parser.add_argument('--complaints', type=int, default=5000)
+    parser.add_argument('--logs-per-complaint', type=int, default=3, help='Maximum logs per complaint')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load')
+    parser.add_argument('--mode', choices=['wsgi', 'server'], default='wsgi')
+    parser.add_argument('--mix', help='Action weights, e.g. register_complaint=5,login=0')
+    parser.add_argument('--db', help='SQLite file (default: a new temporary file)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.departments < len(DEPARTMENT_NAMES):
+        parser.error(f"--departments must be at least {len(DEPARTMENT_NAMES)}")
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='pgrs-loadtest-'), 'loadtest.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    import app as app_module
+    app = app_module.configure_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30, 'check_same_thread': False}},
+        'SESSION_COOKIE_SECURE': False,
+        # Measure the app, not the load shedding of pools sized for gunicorn
+        'ADMISSION_CONTROL_ENABLED': False,
+        'LOG_FILE': None
+    })
+
+    print(f"Seeding {db_path}...")
+    start = time.perf_counter()
+    models = {name: getattr(app_module, name) for name in ('Citizen', 'Department', 'Complaint', 'ComplaintLog')}
+    with app.app_context():
+        seed_data = seed_database(app_module.db, models, args.citizens, args.departments,
+                                  args.complaints, args.logs_per_complaint, args.seed)
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    stats = RouteStats()
+    instrument_app(app, app_module.db, stats)
+
+    server = None
+    if args.mode == 'server':
+        server, base_url = start_local_server(app)
+        make_client = lambda: HTTPClient(base_url)
+    else:
+        make_client = lambda: WSGIClient(app)
+
+    mix = parse_mix(args.mix)
+    print(f"Running {args.users} users for {args.duration}s ({args.mode}), mix: {mix}")
+    start = time.perf_counter()
+    users = [SimulatedUser(make_client, seed_data, mix, stats, start + args.duration, args.seed + i)
+             for i in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - start
+
+    if server:
+        server.shutdown()
+    print_report(stats, elapsed)
+
+if __name__ == "__main__":
+    main()
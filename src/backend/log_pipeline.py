@@ -0,0 +1,211 @@
+# log_pipeline.py
+#
+# Logging without file I/O on the request thread.
+#
+# configure_app() puts a QueueHandler on the root logger, so app.logger and the
+# module loggers (nlp, shadow, ...) only append the record to an in-memory
+# queue. A listener thread takes the records off the queue, formats them as
+# one JSON object per line and writes them to LOG_FILE. The message itself is
+# formatted by the listener too: log with %-style arguments, e.g.
+#   app.logger.info("Complaint %s escalated", complaint_id, extra={'complaint_id': complaint_id})
+# never with f-strings, and only pass values that are not changed afterwards.
+# Keys passed with extra= become fields of the JSON record.
+#
+# When the queue is full (the disk can't keep up) records are dropped and
+# counted instead of blocking the request; the number dropped is logged with
+# the next record that fits. Threads don't survive fork(), so a forked
+# gunicorn worker gets a queue and listener of its own. LOG_FILE is opened
+# with WatchedFileHandler, so logrotate can move it away.
+#
+# Usage: python log_pipeline.py bench [--records N]
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+from flask.logging import default_handler
+
+# Attributes every LogRecord has; anything else was passed with extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one line of JSON with its extra= fields
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that hands the record over unformatted and drops it when
+    the queue is full
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.reported = 0
+
+    def prepare(self, record):
+        # QueueHandler.prepare() formats the message on the caller's thread
+        # so the record can be pickled; this queue never leaves the process
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped != self.reported:
+            notice = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': "Log queue full, dropped %d records", 'args': (self.dropped - self.reported,)
+            })
+            try:
+                self.queue.put_nowait(notice)
+                self.reported = self.dropped
+            except queue.Full:
+                pass
+
+class Listener(QueueListener):
+    """
+    QueueListener whose stop() waits for room in a full queue
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+_handler = None
+_listener = None
+
+def file_handler(path):
+    handler = WatchedFileHandler(path, encoding='utf-8', delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+def configure(app):
+    """
+    Routes all logging of this process through the queue to LOG_FILE
+
+    Does nothing if LOG_FILE is None or the pipeline is already set up.
+
+    Returns:
+        NonBlockingQueueHandler: The handler on the root logger, or None
+    """
+    global _handler, _listener
+    if _handler is not None or not app.config['LOG_FILE']:
+        return _handler
+
+    _handler = NonBlockingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+    _listener = Listener(_handler.queue, file_handler(app.config['LOG_FILE']), respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    # Flask's own stderr handler would format and write on the request thread
+    app.logger.removeHandler(default_handler)
+
+    atexit.register(stop)
+    os.register_at_fork(after_in_child=_restart_in_child)
+    return _handler
+
+def _restart_in_child():
+    # The listener thread stayed in the parent, which may have held the
+    # queue's or the log file's lock at the moment of the fork
+    global _listener
+    _handler.queue = queue.Queue(_handler.queue.maxsize)
+    _handler.dropped = _handler.reported = 0
+    for handler in _listener.handlers:
+        handler.stream = None  # Reopened by the next record (delay=True)
+    _listener = Listener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop():
+    """
+    Writes out the queued records and stops the listener thread
+    """
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _emit_records(logger, records):
+    # What a register_complaint request logs: its access log record and the
+    # result line of src/NLP/main.py
+    for number in range(records):
+        logger.info("%s %s %s", 'POST', '/register-complaint', 302,
+                    extra={'endpoint': 'register_complaint', 'status': 302, 'duration_ms': 12.5})
+        logger.info("Department ID assigned: %s, priority score assigned: %s", number % 5 + 1, 2,
+                    extra={'department_id': number % 5 + 1, 'priority_score': 2})
+
+def bench(records):
+    """
+    Cost of the logging calls on the calling thread with logging disabled,
+    writing synchronously and through the queue
+
+    The CPU time is the calling thread's own (time.thread_time), without the
+    listener thread's formatting and writing; the wall time includes the
+    listener competing for the GIL, as in a CPU-bound loop.
+
+    Returns:
+        dict: setup -> (CPU us per call, wall us per call, seconds until written)
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix='pgrs-logbench-'), 'bench.log')
+    logger = logging.getLogger('pgrs.logbench')
+    logger.propagate = False
+    calls = 2 * records
+    results = {}
+    for setup in ('disabled', 'sync', 'queue'):
+        listener = None
+        if setup == 'queue':
+            handler = NonBlockingQueueHandler(queue.Queue(calls + 1))
+            listener = Listener(handler.queue, file_handler(path))
+            listener.start()
+        else:
+            handler = file_handler(path)
+        logger.handlers = [handler]
+        logger.setLevel(logging.WARNING if setup == 'disabled' else logging.INFO)
+
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        _emit_records(logger, records)
+        cpu = time.thread_time() - cpu_start
+        wall = time.perf_counter() - start
+        if listener is not None:
+            listener.stop()
+        handler.close()
+        results[setup] = (cpu / calls * 1e6, wall / calls * 1e6, time.perf_counter() - start)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Logging pipeline tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help='Cost of logging on the calling thread')
+    bench_parser.add_argument('--records', type=int, default=20000, help='Access log + NLP record pairs per setup')
+    args = parser.parse_args()
+
+    print(f"{2 * args.records} records per setup")
+    print(f"{'setup':<10}{'CPU us/call':>13}{'wall us/call':>14}{'written after s':>17}")
+    for setup, (cpu, wall, written) in bench(args.records).items():
+        print(f"{setup:<10}{cpu:>13.2f}{wall:>14.2f}{written:>17.3f}")
@@ -0,0 +1,85 @@
+# memreport.py
+#
+# Shared versus private memory of the gunicorn workers, read from
+# /proc/<pid>/smaps_rollup (Linux only).
+#
+# Usage: python memreport.py <master_pid>
+
+import os
+import sys
+
+def read_smaps_rollup(pid):
+    """
+    Reads the memory summary of a process
+
+    Args:
+        pid (int): Process id
+
+    Returns:
+        dict: Field name -> size in kB (Rss, Pss, Shared_Clean, Private_Dirty, ...)
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+
+def child_pids(pid):
+    """
+    Lists the direct children of a process
+    """
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, the ppid follows the closing paren
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+def memory_report(master_pid):
+    """
+    Builds the memory report for the master and each of its workers
+
+    Returns:
+        list: One dict per process with pid, role, rss, pss, shared and private (kB)
+    """
+    report = []
+    for role, pid in [('master', master_pid)] + [('worker', p) for p in child_pids(master_pid)]:
+        fields = read_smaps_rollup(pid)
+        report.append({
+            'pid': pid,
+            'role': role,
+            'rss': fields.get('Rss', 0),
+            'pss': fields.get('Pss', 0),
+            'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+            'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+        })
+    return report
+
+def print_report(report):
+    print(f"{'pid':>8} {'role':<7} {'rss kB':>10} {'pss kB':>10} {'shared kB':>10} {'private kB':>11}")
+    for row in report:
+        print(f"{row['pid']:>8} {row['role']:<7} {row['rss']:>10} {row['pss']:>10} "
+              f"{row['shared']:>10} {row['private']:>11}")
+
+    workers = [row for row in report if row['role'] == 'worker']
+    if workers:
+        shared = sum(row['shared'] for row in workers)
+        rss = sum(row['rss'] for row in workers)
+        print(f"\nWorkers: {len(workers)}, total RSS {rss} kB, "
+              f"shared {shared} kB ({100 * shared / rss:.1f}%), "
+              f"sum of PSS {sum(row['pss'] for row in workers)} kB")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python memreport.py <master_pid>")
+        sys.exit(1)
+    print_report(memory_report(int(sys.argv[1])))
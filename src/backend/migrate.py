@@ -0,0 +1,132 @@
+# migrate.py
+#
+# Brings the tables of an existing database up to the models in app.py.
+#
+# db.create_all() (run by configure_app()) creates missing tables but never
+# alters existing ones, so a complaints table created before the location,
+# nlp_version and revision columns fails on the first query that selects them.
+# This adds every column and index of a model that its table lacks, then
+# fills in the geohash of complaints that have coordinates but none (the
+# insert/update hook in app.py only sets it on rows written through the ORM).
+# Run it once after upgrading, before starting the app; a rerun finds nothing
+# to do.
+#
+# Usage: python migrate.py [--dry-run] [--batch-size N]
+
+import argparse
+
+from sqlalchemy import bindparam, inspect, select
+from sqlalchemy.schema import CreateColumn
+
+from app import configure_app, db, Complaint
+from geo import encode_geohash
+
+BATCH_SIZE = 1000
+
+def schema_changes():
+    """
+    Columns and indexes of the models that the database lacks
+
+    Returns:
+        list: (table, 'column' or 'index', Column or Index), tables in
+            dependency order
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    changes = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue  # Created by db.create_all()
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        changes += [(table, 'column', column) for column in table.columns if column.name not in columns]
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        changes += [(table, 'index', index) for index in table.indexes if index.name not in indexes]
+    return changes
+
+def add_column_statement(table, column, dialect):
+    if not column.nullable and column.server_default is None:
+        raise ValueError(f"{table.name}.{column.name} is NOT NULL without a server default, "
+                         "it can't be added to a table with rows")
+    return (f"ALTER TABLE {dialect.identifier_preparer.format_table(table)} "
+            f"ADD COLUMN {CreateColumn(column).compile(dialect=dialect)}")
+
+def apply_schema_changes(changes):
+    """
+    Adds the missing columns first, then creates the missing indexes
+    """
+    # All statements are built before the first runs: MySQL commits each
+    # ALTER TABLE on its own, so a column that can't be added must stop the
+    # migration before it changes anything
+    statements = [add_column_statement(table, column, db.engine.dialect)
+                  for table, kind, column in changes if kind == 'column']
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        for table, kind, index in changes:
+            if kind == 'index':
+                index.create(connection)
+
+def backfill_geohashes(batch_size=BATCH_SIZE):
+    """
+    Sets the geohash of complaints with coordinates but none, in keyset batches
+
+    Returns:
+        int: Number of complaints updated
+    """
+    table = Complaint.__table__
+    filled = 0
+    after_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.complaint_id, table.c.latitude, table.c.longitude).where(
+                table.c.complaint_id > after_id,
+                table.c.geohash.is_(None),
+                table.c.latitude.isnot(None),
+                table.c.longitude.isnot(None)
+            ).order_by(table.c.complaint_id).limit(batch_size)
+        ).all()
+        if not rows:
+            return filled
+
+        try:
+            db.session.execute(
+                table.update().where(table.c.complaint_id == bindparam('target_id')).values(
+                    geohash=bindparam('new_geohash')
+                ),
+                [{'target_id': row.complaint_id, 'new_geohash': encode_geohash(row.latitude, row.longitude)}
+                 for row in rows]
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        filled += len(rows)
+        after_id = rows[-1].complaint_id
+
+def migrate(batch_size=None, dry_run=False):
+    """
+    Adds the missing columns and indexes and backfills the geohashes
+
+    Returns:
+        dict: The schema changes (as 'table.name' strings) and the number of
+            geohashes filled in
+    """
+    changes = schema_changes()
+    described = [f"{kind} {table.name}.{item.name}" for table, kind, item in changes]
+    if dry_run:
+        return {'changes': described, 'geohashes': 0}
+
+    apply_schema_changes(changes)
+    return {'changes': described, 'geohashes': backfill_geohashes(batch_size or BATCH_SIZE)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add missing columns and indexes to an existing database')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the missing columns and indexes')
+    parser.add_argument('--batch-size', type=int, help='Complaints per geohash backfill transaction')
+    args = parser.parse_args()
+
+    with configure_app().app_context():
+        result = migrate(args.batch_size, args.dry_run)
+    for change in result['changes']:
+        print(f"{'Missing' if args.dry_run else 'Added'} {change}")
+    print(f"Done: {len(result['changes'])} schema changes, {result['geohashes']} geohashes filled in")
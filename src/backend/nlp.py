@@ -1,17 +1,28 @@
 # models/nlp.py
 
+import hashlib
+import json
+import logging
 import os
+import re
 import sys
+from functools import lru_cache
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from nltk.sentiment import SentimentIntensityAnalyzer
+from nltk.sentiment.vader import VaderConstants
+from batch_sentiment import LexiconScorer, sentiment_priority
+import nlp_artifact
+
+logger = logging.getLogger(__name__)
 
 # Ensure NLTK data is downloaded
 try:
     nltk.data.find('tokenizers/punkt')
     nltk.data.find('corpora/stopwords')
+    nltk.data.find('corpora/wordnet')
     nltk.data.find('sentiment/vader_lexicon')
 except LookupError:
     nltk.download('punkt')
@@ -19,7 +30,175 @@ except LookupError:
     nltk.download('wordnet')
     nltk.download('vader_lexicon')
 
-def preprocess_text(text):
+# Sentiment scorer: 'vader' (nltk rule-based, one text at a time) or
+# 'lexicon' (batch_sentiment.LexiconScorer, NumPy over whole batches)
+SENTIMENT_BACKEND = os.environ.get('SENTIMENT_BACKEND', 'vader')
+SENTIMENT_BACKENDS = ('vader', 'lexicon')
+
+# Tokenizer used by preprocess_text: 'nltk' (punkt/Treebank word_tokenize) or
+# 'fast' (compiled regex, see TOKEN_PATTERN)
+PREPROCESS_MODE = os.environ.get('PREPROCESS_MODE', 'nltk')
+PREPROCESS_MODES = ('nltk', 'fast')
+
+# Distinct words whose lemma is remembered per process
+LEMMA_CACHE_SIZE = int(os.environ.get('LEMMA_CACHE_SIZE', 20000))
+
+# Precompiled resources built by `python nlp_artifact.py build`; without the
+# file the NLTK corpora are read at startup
+NLP_ARTIFACT_PATH = os.environ.get(
+    'NLP_ARTIFACT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nlp_resources.bin')
+)
+
+# Approximates word_tokenize: numbers like 3.5, 1,000 and 10:30 and hyphenated
+# words ("water-logged", "e-mail") stay whole, contractions split like Treebank
+# ("hasn't" -> "has", "n't"; "it's" -> "it", "'s"; "cannot" -> "can", "not";
+# "gonna" -> "gon", "na"), "..." and "--" are one token, other punctuation
+# becomes its own token. Known differences from word_tokenize: words with an
+# inner apostrophe ("o'clock", "rock'n'roll") and abbreviations or dotted
+# words ("dr.", "u.s.a.", "b.com") are split at the punctuation, and quotes
+# stay '"' instead of becoming `` and ''.
+TOKEN_PATTERN = re.compile(
+    r"\d+(?:[.,:]\d+)+|\.\.\.|--|'(?:s|re|ve|ll|m|d)\b"
+    r"|\b(?:can(?=not\b)|gon(?=na\b)|got(?=ta\b)|wan(?=na\b)|gim(?=me\b)|lem(?=me\b))"
+    r"|\w+(?:-\w+)*(?=n't)|n't|\w+(?:-\w+)*|[^\w\s]"
+)
+
+# Keywords checked in order; the first category with a keyword in the text wins
+CATEGORY_KEYWORDS = {
+    "Sanitation": ["garbage", "trash", "waste", "overflowing"],
+    "Water Supply": ["water", "leak", "pipe", "drain"],
+    "Infrastructure": ["road", "pothole", "bridge", "broken"],
+    "Public Safety": ["crime", "dangerous", "theft", "safety"]
+}
+
+# Mapping categories to departments and their respective IDs
+CATEGORY_DEPARTMENTS = {
+    "Sanitation": ("Sanitation", 1),
+    "Water Supply": ("Water", 2),
+    "Infrastructure": ("Infrastructure", 3),
+    "Public Safety": ("Safety", 4)
+}
+
+# Default category and department for general complaints
+DEFAULT_DEPARTMENT = ("General", 5)
+
+# Keywords that make a complaint HIGH priority regardless of sentiment
+HIGH_PRIORITY_KEYWORDS = ['urgent', 'dangerous', 'critical', 'leaking', 'broken', 'serious']
+
+# Analyzers shared by every call in this process, see load_resources()
+_resources = {}
+
+def keyword_fingerprint():
+    """
+    Hash of the keyword tables, changes whenever a keyword or mapping does
+    """
+    tables = [CATEGORY_KEYWORDS, {category: list(department) for category, department in CATEGORY_DEPARTMENTS.items()},
+              HIGH_PRIORITY_KEYWORDS]
+    return hashlib.sha1(json.dumps(tables).encode()).hexdigest()[:12]
+
+def compile_matcher(keywords):
+    """
+    One regex finding any of the keywords as a substring, like
+    any(keyword in text for keyword in keywords)
+    """
+    return re.compile('|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)))
+
+def load_runtime_resources():
+    """
+    Reads the stopwords, WordNet and the VADER lexicon from the NLTK corpora
+    """
+    lemmatizer = WordNetLemmatizer()
+    lemmatizer.lemmatize('warmup')  # WordNet is read lazily on first use
+    sia = SentimentIntensityAnalyzer()
+    return {
+        'stopwords': frozenset(stopwords.words('english')),
+        'lemmatizer': lemmatizer,
+        'sia': sia,
+        'lexicon_scorer': LexiconScorer(sia.lexicon)
+    }
+
+def load_artifact_resources(artifact):
+    """
+    The same resources backed by a memory-mapped nlp_artifact.Artifact
+
+    VADER looks up every token in the lexicon, so the lexicon is copied into
+    a dict once here (in the gunicorn master, before the fork and
+    gc.freeze()) instead of binary-searching the mapped table per token; the
+    lemma table stays mapped, lemmatize() caches its lookups per word.
+    """
+    lexicon = dict(artifact.lexicon.items())
+    sia = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+    sia.lexicon_file = None
+    sia.lexicon = lexicon
+    sia.constants = VaderConstants()
+    return {
+        'stopwords': frozenset(artifact.stopwords),
+        'lemmatizer': nlp_artifact.TableLemmatizer(artifact.lemmas),
+        'sia': sia,
+        'lexicon_scorer': LexiconScorer(lexicon)
+    }
+
+def load_resources():
+    """
+    Loads the NLP resources once per process and returns them:
+    - stopwords: frozenset of English stopwords
+    - lemmatizer: WordNetLemmatizer with the WordNet corpus already read
+    - sia: VADER SentimentIntensityAnalyzer
+    - lexicon_scorer: LexiconScorer over the VADER lexicon
+    - category_matchers: (compiled keyword matcher, (department, ID)) per category
+    - high_priority_matcher: compiled matcher of HIGH_PRIORITY_KEYWORDS
+    - version: NLP resource version stored with each complaint
+    They come from the artifact at NLP_ARTIFACT_PATH when it exists and was
+    built from the current keyword tables, otherwise from the NLTK corpora.
+    Calling this in the gunicorn master lets the workers share the pages.
+    """
+    if not _resources:
+        artifact = nlp_artifact.load(NLP_ARTIFACT_PATH)
+        if artifact is not None and artifact.keyword_fingerprint != keyword_fingerprint():
+            logger.warning("Ignoring %s: built from other keyword tables, rebuild it with "
+                           "'python nlp_artifact.py build'", NLP_ARTIFACT_PATH)
+            artifact = None
+
+        if artifact is not None:
+            _resources.update(load_artifact_resources(artifact))
+            categories = [(keywords, (department, department_id))
+                          for category, department, department_id, keywords in artifact.categories]
+            high_priority_keywords = artifact.high_priority_keywords
+            _resources['version'] = artifact.version
+        else:
+            _resources.update(load_runtime_resources())
+            categories = [(CATEGORY_KEYWORDS[category], CATEGORY_DEPARTMENTS[category])
+                          for category in CATEGORY_KEYWORDS]
+            high_priority_keywords = HIGH_PRIORITY_KEYWORDS
+            _resources['version'] = f'runtime-{keyword_fingerprint()}'
+
+        _resources['category_matchers'] = [(compile_matcher(keywords), department)
+                                           for keywords, department in categories]
+        _resources['high_priority_matcher'] = compile_matcher(high_priority_keywords)
+    return _resources
+
+def resource_version():
+    """
+    Version of the resources classifying complaints in this process
+    """
+    return load_resources()['version']
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word):
+    """
+    WordNet lemma of a word, computed once per distinct word
+    """
+    return load_resources()['lemmatizer'].lemmatize(word)
+
+def tokenize(text, mode=None):
+    mode = mode or PREPROCESS_MODE
+    if mode not in PREPROCESS_MODES:
+        raise ValueError(f"Unknown preprocessing mode: {mode}")
+    if mode == 'fast':
+        return TOKEN_PATTERN.findall(text)
+    return word_tokenize(text)
+
+def preprocess_text(text, mode=None):
     """
     Preprocesses the complaint text by:
     - Lowercasing
@@ -27,75 +206,114 @@ def preprocess_text(text):
     - Removing stopwords
     - Lemmatizing
     """
-    text = text.lower()
-    tokens = word_tokenize(text)
-    tokens = [word for word in tokens if word not in stopwords.words('english')]
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
+    stop_words = load_resources()['stopwords']
+    tokens = tokenize(text.lower(), mode)
+    tokens = [lemmatize(word) for word in tokens if word not in stop_words]
     return " ".join(tokens)
 
+def preprocess_batch(texts, mode=None):
+    """
+    Preprocesses many complaint texts, see preprocess_text
+    """
+    return [preprocess_text(text, mode) for text in texts]
+
+def compare_preprocessing(texts):
+    """
+    Compares the 'fast' preprocessing mode with 'nltk' on a corpus
+
+    Returns:
+        dict: Number of texts, number with identical output and the
+            differing texts with the tokens only one mode produced
+    """
+    differences = []
+    for text, expected, actual in zip(texts, preprocess_batch(texts, 'nltk'), preprocess_batch(texts, 'fast')):
+        if expected != actual:
+            expected_tokens, actual_tokens = expected.split(), actual.split()
+            differences.append({
+                'text': text,
+                'nltk_only': [token for token in expected_tokens if token not in actual_tokens],
+                'fast_only': [token for token in actual_tokens if token not in expected_tokens]
+            })
+    return {'total': len(texts), 'identical': len(texts) - len(differences), 'differences': differences}
+
 def categorize_complaint(text):
     """
     Categorizes the complaint based on predefined keywords and returns the associated department and category.
     """
-    categories = {
-        "Sanitation": ["garbage", "trash", "waste", "overflowing"],
-        "Water Supply": ["water", "leak", "pipe", "drain"],
-        "Infrastructure": ["road", "pothole", "bridge", "broken"],
-        "Public Safety": ["crime", "dangerous", "theft", "safety"]
-    }
-
-    # Mapping categories to departments and their respective IDs
-    category_to_department = {
-        "Sanitation": ("Sanitation", 1),
-        "Water Supply": ("Water", 2),
-        "Infrastructure": ("Infrastructure", 3),
-        "Public Safety": ("Safety", 4)
-    }
+    text = text.lower()
+    for matcher, department in load_resources()['category_matchers']:
+        if matcher.search(text):
+            return department  # Return both department name and department ID
 
-    for category, keywords in categories.items():
-        if any(keyword in text.lower() for keyword in keywords):
-            return category_to_department[category]  # Return both department name and department ID
+    return DEFAULT_DEPARTMENT
 
-    return ("General", 5)  # Default category and department for general complaints
+def has_high_priority_keyword(text):
+    return load_resources()['high_priority_matcher'].search(text.lower()) is not None
 
-def assign_priority(text):
+def assign_priority(text, backend=None):
     """
     Assigns priority to the complaint text based on:
     - Keywords in the complaint
     - Sentiment analysis
     """
     # Priority based on predefined keywords
-    high_priority_keywords = ['urgent', 'dangerous', 'critical', 'leaking', 'broken', 'serious']
-    for keyword in high_priority_keywords:
-        if keyword in text.lower():
-            return "HIGH"
+    if has_high_priority_keyword(text):
+        return "HIGH"
     
     # Sentiment-based priority assignment
-    sentiment, sentiment_priority = analyze_sentiment(text)
-    
-    # Return sentiment-based priority if no keyword priority is found
-    if sentiment_priority == "HIGH":
-        return "HIGH"
-    elif sentiment_priority == "MEDIUM":
-        return "MEDIUM"
-    else:
-        return "LOW"
+    sentiment, priority = analyze_sentiment(text, backend)
+    return priority
+
+def assign_priority_batch(texts, backend=None):
+    """
+    Assigns priorities to many complaint texts at once. Texts without a
+    high priority keyword are sentiment-scored in a single batch.
+    """
+    priorities = ["HIGH" if has_high_priority_keyword(text) else None for text in texts]
+    pending = [i for i, priority in enumerate(priorities) if priority is None]
+    sentiments = analyze_sentiment_batch([texts[i] for i in pending], backend)
+    for i, (sentiment, priority) in zip(pending, sentiments):
+        priorities[i] = priority
+    return priorities
 
-def analyze_sentiment(text):
+def analyze_sentiment(text, backend=None):
     """
     Analyzes sentiment of the complaint text and assigns priority.
     """
-    sia = SentimentIntensityAnalyzer()
+    backend = backend or SENTIMENT_BACKEND
+    if backend != 'vader':
+        return analyze_sentiment_batch([text], backend)[0]
+
+    sia = load_resources()['sia']
     sentiment = sia.polarity_scores(text)
-    
-    if sentiment['compound'] == 0.0:
-        priority = "LOW"
-    elif sentiment['compound'] < -0.5:
-        priority = "HIGH"
-    elif -0.5 <= sentiment['compound'] <= 0.5:
-        priority = "MEDIUM"
-    else:
-        priority = "LOW"
-    
-    return sentiment, priority 
\ No newline at end of file
+    return sentiment, sentiment_priority(sentiment['compound'])
+
+def analyze_sentiment_batch(texts, backend=None):
+    """
+    Analyzes the sentiment of many texts with the selected backend.
+
+    Returns:
+        list: (sentiment dict, priority) per text, as analyze_sentiment
+    """
+    backend = backend or SENTIMENT_BACKEND
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(f"Unknown sentiment backend: {backend}")
+
+    if backend == 'lexicon':
+        return load_resources()['lexicon_scorer'].analyze_batch(texts)
+    return [analyze_sentiment(text, 'vader') for text in texts] 
+
+if __name__ == "__main__":
+    # Equivalence check of the preprocessing modes: python nlp.py <complaints.txt>
+    if len(sys.argv) != 2:
+        print("Usage: python nlp.py <complaints.txt>  (one complaint per line)")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding='utf-8') as f:
+        complaints = [line.strip() for line in f if line.strip()]
+
+    report = compare_preprocessing(complaints)
+    print(f"Identical output: {report['identical']}/{report['total']}")
+    for row in report['differences']:
+        print(f"- {row['text'][:80]}")
+        print(f"    nltk only: {row['nltk_only']}  fast only: {row['fast_only']}")
\ No newline at end of file
@@ -0,0 +1,385 @@
+# nlp_artifact.py
+#
+# Precompiled resources for the rule engine in nlp.py, in one binary file that
+# worker processes memory-map instead of reading the NLTK corpora:
+# - stopwords
+# - lemma table: the words WordNetLemmatizer changes with at most one suffix
+#   rule, mapped to their lemma; a word not in the table is its own lemma
+#   (an approximation, see build_lemma_table()). Before writing, build
+#   classifies a sample corpus (the stored complaints, or --sample FILE) with
+#   the table and with WordNet, and refuses to write the artifact if any
+#   department or priority differs.
+# - sentiment weights: the VADER lexicon
+# - keyword matchers and the category -> department map of nlp.py
+#
+# The word tables are sorted and searched in place (binary search over an
+# offset array), so loading reads only the header and every process mapping
+# the file shares its pages. The lexicon is the exception: VADER looks up
+# every token, so nlp.load_artifact_resources() copies it into a dict once,
+# in the gunicorn master before the fork. The version is a hash of the
+# content; nlp.py stores it on each classified complaint. An artifact built from different
+# keyword tables than the running nlp.py is ignored, see nlp.load_resources().
+#
+# Usage: python nlp_artifact.py build [--output PATH] [--sample FILE] [--sample-limit N]
+#        python nlp_artifact.py info [PATH]
+
+import argparse
+import hashlib
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+
+MAGIC = b'PGRSNLP1'
+
+# Stored complaints classified both ways before an artifact is written
+SAMPLE_LIMIT = 5000
+
+class ClassificationMismatch(Exception):
+    """
+    The lemma table classifies part of the sample differently from WordNet
+    """
+
+    def __init__(self, result):
+        super().__init__(f"{len(result['mismatches'])} of {result['total']} sample complaints "
+                         f"classified differently with the lemma table")
+        self.result = result
+
+def _pad(data):
+    return data + b'\0' * (-len(data) % 8)
+
+def _pack_strings(strings):
+    encoded = [string.encode() for string in strings]
+    offsets = array('I', [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return _pad(offsets.tobytes()) + _pad(b''.join(encoded))
+
+def pack_table(kind, items):
+    """
+    Serializes a word table
+
+    Args:
+        kind (str): 'set' (words only), 'map' (word -> word) or 'weights' (word -> float)
+        items: Words for 'set', otherwise a dict
+
+    Returns:
+        bytes: Word count, key offsets and key bytes sorted by their UTF-8
+            encoding, then the values in the same order
+    """
+    keys = sorted(items, key=str.encode)
+    data = _pad(struct.pack('=I', len(keys))) + _pack_strings(keys)
+    if kind == 'map':
+        data += _pack_strings([items[key] for key in keys])
+    elif kind == 'weights':
+        data += array('d', [items[key] for key in keys]).tobytes()
+    return data
+
+class WordTable(Mapping):
+    """
+    Read-only mapping over a table written by pack_table, looked up without
+    copying the table out of the buffer
+    """
+
+    def __init__(self, kind, buffer):
+        self.kind = kind
+        self._count = struct.unpack_from('=I', buffer, 0)[0]
+        position = 8
+        self._key_offsets, self._keys, position = self._strings(buffer, position)
+        if kind == 'map':
+            self._value_offsets, self._values, position = self._strings(buffer, position)
+        elif kind == 'weights':
+            self._weights = buffer[position:position + 8 * self._count].cast('d')
+
+    def _strings(self, buffer, position):
+        size = 4 * (self._count + 1)
+        offsets = buffer[position:position + size].cast('I')
+        position += size + (-size % 8)
+        strings = buffer[position:position + offsets[-1]]
+        return offsets, strings, position + offsets[-1] + (-offsets[-1] % 8)
+
+    def _key(self, index):
+        return self._keys[self._key_offsets[index]:self._key_offsets[index + 1]].tobytes()
+
+    def index(self, word):
+        """
+        Position of the word in the table, or -1
+        """
+        target = word.encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._key(low) == target:
+            return low
+        return -1
+
+    def _value(self, index):
+        if self.kind == 'map':
+            return self._values[self._value_offsets[index]:self._value_offsets[index + 1]].tobytes().decode()
+        if self.kind == 'weights':
+            return self._weights[index]
+        return True
+
+    def get(self, word, default=None):
+        index = self.index(word)
+        return self._value(index) if index >= 0 else default
+
+    def __getitem__(self, word):
+        index = self.index(word)
+        if index < 0:
+            raise KeyError(word)
+        return self._value(index)
+
+    def __contains__(self, word):
+        return isinstance(word, str) and self.index(word) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self._key(index).decode()
+
+    def values(self):
+        # In table order, without a lookup per key
+        return [self._value(index) for index in range(self._count)]
+
+    def items(self):
+        return list(zip(self, self.values()))
+
+class TableLemmatizer:
+    """
+    Stands in for WordNetLemmatizer (nouns, as nlp.py uses it)
+    """
+
+    def __init__(self, lemmas):
+        self.lemmas = lemmas
+
+    def lemmatize(self, word):
+        return self.lemmas.get(word, word)
+
+class Artifact:
+    """
+    A memory-mapped artifact file
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an NLP artifact")
+
+        header_size = struct.unpack_from('=I', buffer, len(MAGIC))[0]
+        header_start = len(MAGIC) + 4
+        self.header = json.loads(buffer[header_start:header_start + header_size].tobytes())
+        if self.header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was built on a {self.header['byteorder']}-endian machine")
+
+        data_start = header_start + header_size + (-(header_start + header_size) % 8)
+        self.tables = {}
+        for name, (kind, offset, size) in self.header['tables'].items():
+            start = data_start + offset
+            self.tables[name] = WordTable(kind, buffer[start:start + size])
+
+        self.version = self.header['version']
+        self.keyword_fingerprint = self.header['keyword_fingerprint']
+        self.stopwords = self.tables['stopwords']
+        self.lemmas = self.tables['lemmas']
+        self.lexicon = self.tables['lexicon']
+        self.categories = self.header['categories']
+        self.high_priority_keywords = self.header['high_priority_keywords']
+
+def write(path, stopwords, lemmas, lexicon, categories, high_priority_keywords, keyword_fingerprint):
+    """
+    Writes an artifact
+
+    Args:
+        categories (list): [category, department name, department ID, keywords]
+            in matching order
+        keyword_fingerprint (str): nlp.keyword_fingerprint() of the tables
+
+    Returns:
+        str: Version of the artifact
+    """
+    tables = {}
+    data = b''
+    for name, kind, items in (('stopwords', 'set', stopwords), ('lemmas', 'map', lemmas),
+                              ('lexicon', 'weights', lexicon)):
+        packed = pack_table(kind, items)
+        tables[name] = (kind, len(data), len(packed))
+        data += packed
+
+    header = {
+        'byteorder': sys.byteorder,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'tables': tables,
+        'categories': categories,
+        'high_priority_keywords': high_priority_keywords,
+        'keyword_fingerprint': keyword_fingerprint
+    }
+    content = json.dumps([categories, high_priority_keywords]).encode() + data
+    header['version'] = hashlib.sha1(content).hexdigest()[:12]
+
+    header_bytes = json.dumps(header).encode()
+    prefix = MAGIC + struct.pack('=I', len(header_bytes)) + header_bytes
+    with open(path, 'wb') as f:
+        f.write(_pad(prefix))
+        f.write(data)
+    return header['version']
+
+def load(path):
+    """
+    Maps the artifact at path, or returns None if there is no file
+    """
+    try:
+        return Artifact(path)
+    except FileNotFoundError:
+        return None
+
+def build_lemma_table(lemmatizer):
+    """
+    The words WordNetLemmatizer.lemmatize (noun) changes, with their lemma
+
+    The candidates are the noun exception words and all noun lemmas with
+    each morphy suffix rule undone once. This is an approximation: morphy
+    keeps applying the rules while no form is in WordNet, so a word that
+    needs two or more rules (e.g. a doubled plural ending) is changed by
+    WordNetLemmatizer but missing from the table, and stays as it is.
+    """
+    from nltk.corpus import wordnet
+
+    substitutions = wordnet.MORPHOLOGICAL_SUBSTITUTIONS['n']
+    candidates = set(wordnet._exception_map['n'])
+    for lemma in wordnet.all_lemma_names(pos='n'):
+        for old, new in substitutions:
+            if lemma.endswith(new):
+                candidates.add(lemma[:len(lemma) - len(new)] + old)
+
+    lemmas = {}
+    for word in candidates:
+        lemma = lemmatizer.lemmatize(word)
+        if lemma != word:
+            lemmas[word] = lemma
+    return lemmas
+
+def compare_classification(texts, resources, lemmas):
+    """
+    Preprocesses sample texts with the WordNet lemmatizer and with the lemma
+    table, and classifies both where the lemmas differ
+
+    Args:
+        resources (dict): nlp.load_runtime_resources()
+        lemmas (dict): The lemma table
+
+    Returns:
+        dict: Number of texts, number whose preprocessed text differs, and
+            per text classified differently (text, WordNet (department_id,
+            priority), table (department_id, priority), differing words)
+    """
+    import nlp
+
+    lemmatizer = resources['lemmatizer']
+    table = TableLemmatizer(lemmas)
+    differing = 0
+    mismatches = []
+    for text in texts:
+        tokens = [token for token in nlp.tokenize(text.lower()) if token not in resources['stopwords']]
+        expected = " ".join(lemmatizer.lemmatize(token) for token in tokens)
+        actual = " ".join(table.lemmatize(token) for token in tokens)
+        if expected == actual:
+            continue
+
+        differing += 1
+        results = [(nlp.categorize_complaint(processed)[1], nlp.assign_priority(processed))
+                   for processed in (expected, actual)]
+        if results[0] != results[1]:
+            words = sorted({token for token in tokens if lemmatizer.lemmatize(token) != table.lemmatize(token)})
+            mismatches.append((text, *results, words))
+    return {'total': len(texts), 'differing': differing, 'mismatches': mismatches}
+
+def stored_complaint_texts(limit=SAMPLE_LIMIT):
+    """
+    The descriptions of the latest stored complaints
+    """
+    from app import configure_app, Complaint
+
+    with configure_app().app_context():
+        rows = Complaint.query.with_entities(Complaint.description).order_by(
+            Complaint.complaint_id.desc()).limit(limit)
+        return [row.description for row in rows]
+
+def build(path, sample_texts):
+    """
+    Compiles the artifact from the NLTK corpora and the tables in nlp.py
+
+    Raises:
+        ClassificationMismatch: If the lemma table classifies one of
+            sample_texts differently from WordNet; nothing is written
+    """
+    import nlp
+
+    resources = nlp.load_runtime_resources()
+    lemmas = build_lemma_table(resources['lemmatizer'])
+    check = compare_classification(sample_texts, resources, lemmas)
+    if check['mismatches']:
+        raise ClassificationMismatch(check)
+
+    return write(
+        path,
+        stopwords=resources['stopwords'],
+        lemmas=lemmas,
+        lexicon=resources['sia'].lexicon,
+        categories=[[category, *nlp.CATEGORY_DEPARTMENTS[category], keywords]
+                    for category, keywords in nlp.CATEGORY_KEYWORDS.items()],
+        high_priority_keywords=nlp.HIGH_PRIORITY_KEYWORDS,
+        keyword_fingerprint=nlp.keyword_fingerprint()
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or inspect the NLP artifact')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Compile the artifact from the NLTK corpora')
+    build_parser.add_argument('--output', help='Artifact path (default NLP_ARTIFACT_PATH)')
+    build_parser.add_argument('--sample', help='Complaint texts to check, one per line (default: stored complaints)')
+    build_parser.add_argument('--sample-limit', type=int, default=SAMPLE_LIMIT,
+                              help='Stored complaints to check')
+    info_parser = subparsers.add_parser('info', help='Show the version and table sizes')
+    info_parser.add_argument('path', nargs='?', help='Artifact path (default NLP_ARTIFACT_PATH)')
+    args = parser.parse_args()
+
+    from nlp import NLP_ARTIFACT_PATH
+    if args.command == 'build':
+        path = args.output or NLP_ARTIFACT_PATH
+        if args.sample:
+            with open(args.sample, encoding='utf-8') as f:
+                sample_texts = [line.strip() for line in f if line.strip()]
+        else:
+            sample_texts = stored_complaint_texts(args.sample_limit)
+        try:
+            version = build(path, sample_texts)
+        except ClassificationMismatch as e:
+            print(f"Not written: {e}")
+            for text, expected, actual, words in e.result['mismatches'][:10]:
+                print(f"  {text[:60]!r}: WordNet {expected}, table {actual} ({', '.join(words)})")
+            sys.exit(1)
+        print(f"Checked {len(sample_texts)} sample complaints")
+        print(f"Wrote {path} (version {version})")
+    else:
+        path = args.path or NLP_ARTIFACT_PATH
+        start = time.perf_counter()
+        artifact = load(path)
+        if artifact is None:
+            print(f"No artifact at {path}")
+            sys.exit(1)
+        print(f"{path}: version {artifact.version}, built {artifact.header['built_at']}, "
+              f"mapped in {(time.perf_counter() - start) * 1000:.2f}ms")
+        for name, table in artifact.tables.items():
+            print(f"  {name}: {len(table)} words")
@@ -0,0 +1,161 @@
+# profiler.py
+#
+# On-demand cProfile of single requests in production.
+#
+# With PROFILER_ENABLED, configure_app() wraps the WSGI app; a request is
+# profiled when it carries the PROFILER_HEADER header with PROFILER_TOKEN as
+# its value, or when it is picked by PROFILER_SAMPLE_RATE. The profile covers
+# the whole request (NLP, SQLAlchemy, Jinja) and is saved to PROFILER_DIR as
+#   <endpoint>__<time>__<milliseconds>ms__<pid>-<n>.prof
+# readable with pstats or snakeviz. Without PROFILER_ENABLED nothing is
+# installed, so requests pay nothing. One request per process is profiled at
+# a time; the event streams are never profiled since their body runs for
+# minutes.
+#
+# Usage: python profiler.py report [--dir DIR] [--route ENDPOINT] [--top N]
+#                                  [--sort tottime|cumtime]
+
+import argparse
+import cProfile
+import glob
+import hmac
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+
+from werkzeug.exceptions import HTTPException
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# Endpoints whose responses are long-lived streams
+EXCLUDED_ENDPOINTS = {'static', 'department_events', 'citizen_events'}
+
+class ProfilerMiddleware:
+    """
+    WSGI middleware profiling the requests picked by header or sampling
+    """
+
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.directory = app.config['PROFILER_DIR']
+        self.sample_rate = app.config['PROFILER_SAMPLE_RATE']
+        self.header = 'HTTP_' + app.config['PROFILER_HEADER'].upper().replace('-', '_')
+        self.token = app.config['PROFILER_TOKEN']
+        self.routes = app.config['PROFILER_ROUTES']
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def endpoint(self, environ):
+        try:
+            return self.app.url_map.bind_to_environ(environ).match()[0]
+        except HTTPException:
+            return None
+
+    def wanted(self, environ):
+        token = environ.get(self.header)
+        if token is not None and self.token:
+            return hmac.compare_digest(token, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.wanted(environ):
+            return self.wsgi_app(environ, start_response)
+
+        endpoint = self.endpoint(environ)
+        if endpoint is None or endpoint in EXCLUDED_ENDPOINTS or (self.routes and endpoint not in self.routes):
+            return self.wsgi_app(environ, start_response)
+
+        # cProfile can't run two profiles at once in a process
+        if not self._lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                app_iter = self.wsgi_app(environ, start_response)
+                try:
+                    body = list(app_iter)
+                finally:
+                    if hasattr(app_iter, 'close'):
+                        app_iter.close()
+            finally:
+                profile.disable()
+            elapsed = time.perf_counter() - start
+            self.save(profile, endpoint, elapsed)
+        finally:
+            self._lock.release()
+        return body
+
+    def save(self, profile, endpoint, elapsed):
+        name = (f"{endpoint}__{time.strftime('%Y%m%dT%H%M%S')}__{elapsed * 1000:.0f}ms__"
+                f"{os.getpid()}-{next(self._counter)}.prof")
+        profile.dump_stats(os.path.join(self.directory, name))
+
+def install(app):
+    """
+    Wraps the app's WSGI callable once, if PROFILER_ENABLED
+    """
+    if app.config.get('PROFILER_ENABLED') and 'profiler' not in app.extensions:
+        app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app)
+        app.extensions['profiler'] = app.wsgi_app
+
+def parse_name(path):
+    """
+    Returns:
+        tuple: (endpoint, milliseconds) from a profile file name
+    """
+    endpoint, _, milliseconds, _ = os.path.basename(path).split('__')
+    return endpoint, float(milliseconds[:-2])
+
+def function_name(function):
+    filename, line, name = function
+    if filename == '~':
+        return name  # built-in
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def report(directory, route=None, top=15, sort='tottime'):
+    """
+    Prints the hottest functions per endpoint over all saved profiles
+    """
+    files = defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(directory, '*.prof'))):
+        endpoint, milliseconds = parse_name(path)
+        if route is None or endpoint == route:
+            files[endpoint].append((path, milliseconds))
+
+    if not files:
+        print(f"No profiles in {directory}")
+        return
+
+    column = 2 if sort == 'tottime' else 3
+    for endpoint, profiles in sorted(files.items()):
+        timings = sorted(milliseconds for _, milliseconds in profiles)
+        stats = pstats.Stats(*[path for path, _ in profiles])
+        total = stats.total_tt or 1
+        print(f"\n{endpoint}: {len(profiles)} profiles, median {timings[len(timings) // 2]:.0f}ms, "
+              f"max {timings[-1]:.0f}ms")
+        print(f"  {'calls':>9} {'tottime':>9} {'cumtime':>9} {'%':>6}  function")
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][column], reverse=True)[:top]
+        for function, (primitive_calls, calls, tottime, cumtime, callers) in rows:
+            print(f"  {calls / len(profiles):>9.0f} {tottime / len(profiles):>9.4f} {cumtime / len(profiles):>9.4f} "
+                  f"{100 * tottime / total:>5.1f}%  {function_name(function)}")
+    print("\nCalls and seconds are per profiled request; % is the share of all own time.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Aggregate saved request profiles')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help='Top functions per endpoint')
+    report_parser.add_argument('--dir', default=DEFAULT_DIR, help='Directory with the .prof files (PROFILER_DIR)')
+    report_parser.add_argument('--route', help='Only this endpoint')
+    report_parser.add_argument('--top', type=int, default=15, help='Functions listed per endpoint')
+    report_parser.add_argument('--sort', choices=['tottime', 'cumtime'], default='tottime')
+    args = parser.parse_args()
+
+    report(args.dir, args.route, args.top, args.sort)
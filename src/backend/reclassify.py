@@ -0,0 +1,301 @@
+# reclassify.py
+#
+# Updates the stored category, department and priority of complaints after
+# the keyword tables in nlp.py change, running the NLP again only on the
+# complaints whose result can change.
+#
+# keyword_tables.json holds the tables the stored complaints were classified
+# with. The job diffs it against the current tables: keywords added to or
+# removed from a category or HIGH_PRIORITY_KEYWORDS, and the keywords of
+# categories that moved in the matching order. The complaint_terms inverted
+# index (term -> complaints) gives the complaints whose preprocessed text
+# contains one of them; categories mapped to another department add the
+# complaints stored under the old one. Those complaints are classified again
+# in batches and the changes written with one executemany UPDATE per batch.
+# Only the fields the diff can affect are recomputed and written: category
+# and department for category changes, priority for HIGH_PRIORITY_KEYWORDS
+# changes. A complaint that escalation.py raised keeps the higher of its
+# stored and its new priority. The UPDATE bumps Complaint.revision, so the
+# department dashboards see the change.
+#
+# keyword_tables.json is tracked in the repository; --save-baseline replaces
+# it with the current tables after the run, to be committed with the table
+# change.
+#
+# Complaints stored before the term index existed are indexed once with
+# --index-missing, which preprocesses every complaint without terms.
+#
+# Usage: python reclassify.py [--dry-run] [--batch-size N] [--baseline PATH]
+#                             [--save-baseline] [--index-missing] [--report PATH]
+
+import argparse
+import json
+import os
+from collections import Counter
+
+from sqlalchemy import bindparam, select
+
+import nlp
+from app import configure_app, db, Complaint, ComplaintEscalation, ComplaintTerm, Department, index_complaint_terms
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keyword_tables.json')
+
+BATCH_SIZE = 500
+
+# Terms per IN (...) list when looking up complaints in the term index
+TERM_CHUNK_SIZE = 500
+
+PRIORITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+
+def current_tables():
+    return {
+        'categories': [[category, keywords] for category, keywords in nlp.CATEGORY_KEYWORDS.items()],
+        'departments': {category: list(department) for category, department in nlp.CATEGORY_DEPARTMENTS.items()},
+        'high_priority': list(nlp.HIGH_PRIORITY_KEYWORDS)
+    }
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def write_baseline(path, tables):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tables, f, indent=2)
+        f.write('\n')
+
+def diff_tables(old, new):
+    """
+    Finds what a change of the keyword tables can affect
+
+    A complaint can only change category or priority if its text contains a
+    keyword that was added or removed, or a keyword of a category whose
+    position in the matching order changed (the first matching category wins).
+    The category tables only affect category and department, the high
+    priority keywords only the priority.
+
+    Returns:
+        tuple: (set of keywords, list of (old department, new department)
+            for categories mapped to another department, set of the fields
+            that can change: 'category' and/or 'priority')
+    """
+    old_pairs = {(category, keyword) for category, keywords in old['categories'] for keyword in keywords}
+    new_pairs = {(category, keyword) for category, keywords in new['categories'] for keyword in keywords}
+    keywords = {keyword for _, keyword in old_pairs ^ new_pairs}
+    priority_keywords = set(old['high_priority']) ^ set(new['high_priority'])
+
+    old_keywords = dict((category, keywords) for category, keywords in old['categories'])
+    new_keywords = dict((category, keywords) for category, keywords in new['categories'])
+    old_order = [category for category in old_keywords if category in new_keywords]
+    new_order = [category for category in new_keywords if category in old_keywords]
+    moved = next((i for i, (a, b) in enumerate(zip(old_order, new_order)) if a != b), None)
+    if moved is not None:
+        for category in old_order[moved:]:
+            keywords.update(old_keywords[category], new_keywords[category])
+
+    remapped = [(tuple(old['departments'][category]), tuple(new['departments'][category]))
+                for category in old['departments']
+                if category in new['departments'] and old['departments'][category] != new['departments'][category]]
+
+    fields = set()
+    if keywords or remapped:
+        fields.add('category')
+    if priority_keywords:
+        fields.add('priority')
+    return keywords | priority_keywords, remapped, fields
+
+def matching_terms(keywords):
+    """
+    Indexed terms that may be part of a keyword match
+
+    The keywords are matched as substrings of the space-joined terms, so
+    every match contains a term with the keyword (or, for a keyword of
+    several words, its longest word) as a substring.
+    """
+    if not keywords:
+        return []
+    matcher = nlp.compile_matcher({max(keyword.split(), key=len) for keyword in keywords if keyword.split()})
+    terms = db.session.query(ComplaintTerm.term).distinct().yield_per(5000)
+    return [row.term for row in terms if matcher.search(row.term)]
+
+def candidate_complaint_ids(keywords, remapped):
+    """
+    IDs of the complaints whose classification may change, in ascending order
+    """
+    complaint_ids = set()
+    terms = matching_terms(keywords)
+    for start in range(0, len(terms), TERM_CHUNK_SIZE):
+        rows = db.session.query(ComplaintTerm.complaint_id).filter(
+            ComplaintTerm.term.in_(terms[start:start + TERM_CHUNK_SIZE])
+        ).distinct()
+        complaint_ids.update(row.complaint_id for row in rows)
+
+    for (name, department_id), _ in remapped:
+        rows = db.session.query(Complaint.complaint_id).filter(
+            Complaint.category == name, Complaint.department_id == department_id
+        )
+        complaint_ids.update(row.complaint_id for row in rows)
+    return sorted(complaint_ids)
+
+def reclassify_batch(complaint_ids, fields, dry_run=False):
+    """
+    Classifies a batch of complaints again and writes the ones that changed
+
+    Args:
+        fields (set): What to recompute, 'category' (with the department)
+            and/or 'priority'; the other fields keep their stored values
+
+    Returns:
+        list: (complaint_id, old (category, department_id, priority), new one)
+    """
+    rows = db.session.query(
+        Complaint.complaint_id, Complaint.description, Complaint.category,
+        Complaint.department_id, Complaint.priority
+    ).filter(Complaint.complaint_id.in_(complaint_ids)).all()
+
+    escalated = set()
+    if 'priority' in fields:
+        escalated = {row.complaint_id for row in db.session.query(ComplaintEscalation.complaint_id).filter(
+            ComplaintEscalation.complaint_id.in_(complaint_ids)
+        ).distinct()}
+
+    version = nlp.resource_version()
+    changes = []
+    for row in rows:
+        processed_text = nlp.preprocess_text(row.description)
+        category, department_id, priority = row.category, row.department_id, row.priority
+        if 'category' in fields:
+            category, department_id = nlp.categorize_complaint(processed_text)
+        if 'priority' in fields:
+            priority = nlp.assign_priority(processed_text)
+            # Never undo an escalation
+            if row.complaint_id in escalated and PRIORITY_RANK[priority] < PRIORITY_RANK[row.priority]:
+                priority = row.priority
+        old = (row.category, row.department_id, row.priority)
+        new = (category, department_id, priority)
+        if new != old:
+            changes.append((row.complaint_id, old, new))
+
+    if changes and not dry_run:
+        table = Complaint.__table__
+        values = {'nlp_version': bindparam('new_version'), 'revision': table.c.revision + 1}
+        if 'category' in fields:
+            values.update(category=bindparam('new_category'), department_id=bindparam('new_department_id'))
+        if 'priority' in fields:
+            values['priority'] = bindparam('new_priority')
+        try:
+            db.session.execute(
+                table.update().where(table.c.complaint_id == bindparam('target_id')).values(values),
+                [{'target_id': complaint_id, 'new_category': new[0], 'new_department_id': new[1],
+                  'new_priority': new[2], 'new_version': version}
+                 for complaint_id, old, new in changes]
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return changes
+
+def index_missing_terms(batch_size=BATCH_SIZE):
+    """
+    Adds the term index rows of complaints that have none
+
+    Returns:
+        int: Number of complaints indexed
+    """
+    indexed = 0
+    after_id = 0
+    while True:
+        rows = db.session.query(Complaint.complaint_id, Complaint.description).filter(
+            Complaint.complaint_id > after_id,
+            ~Complaint.complaint_id.in_(select(ComplaintTerm.complaint_id))
+        ).order_by(Complaint.complaint_id).limit(batch_size).all()
+        if not rows:
+            return indexed
+
+        for row in rows:
+            index_complaint_terms(row.complaint_id, nlp.preprocess_text(row.description))
+        db.session.commit()
+        indexed += len(rows)
+        after_id = rows[-1].complaint_id
+        print(f"Indexed {indexed} complaints (up to #{after_id})")
+
+def reclassify_complaints(baseline_path=None, batch_size=None, dry_run=False, save_baseline=False):
+    """
+    Reclassifies the complaints the keyword table change can affect
+
+    Args:
+        save_baseline (bool): Replace the baseline file with the current
+            tables afterwards (not on a dry run)
+
+    Returns:
+        dict: Keywords and remapped departments found by the diff, number
+            of candidate and changed complaints, and the department and
+            priority moves as (old, new) -> count
+    """
+    baseline_path = baseline_path or BASELINE_PATH
+    batch_size = batch_size or BATCH_SIZE
+    tables = current_tables()
+    keywords, remapped, fields = diff_tables(load_baseline(baseline_path), tables)
+
+    complaint_ids = candidate_complaint_ids(keywords, remapped)
+    department_moves = Counter()
+    priority_moves = Counter()
+    changed = 0
+    for start in range(0, len(complaint_ids), batch_size):
+        changes = reclassify_batch(complaint_ids[start:start + batch_size], fields, dry_run)
+        for complaint_id, old, new in changes:
+            if old[1] != new[1]:
+                department_moves[(old[1], new[1])] += 1
+            if old[2] != new[2]:
+                priority_moves[(old[2], new[2])] += 1
+        changed += len(changes)
+
+    if save_baseline and not dry_run:
+        write_baseline(baseline_path, tables)
+
+    return {
+        'keywords': sorted(keywords),
+        'remapped': remapped,
+        'candidates': len(complaint_ids),
+        'changed': changed,
+        'department_moves': department_moves,
+        'priority_moves': priority_moves
+    }
+
+def print_report(result, department_names):
+    def department(department_id):
+        return f"{department_names.get(department_id, 'Unknown')} ({department_id})"
+
+    print(f"Changed keywords: {', '.join(result['keywords']) or '-'}")
+    for old, new in result['remapped']:
+        print(f"Remapped: {old[0]} ({old[1]}) -> {new[0]} ({new[1]})")
+    print(f"Candidates: {result['candidates']}, changed: {result['changed']}")
+    for (old, new), count in result['department_moves'].most_common():
+        print(f"  {department(old)} -> {department(new)}: {count}")
+    for (old, new), count in result['priority_moves'].most_common():
+        print(f"  priority {old} -> {new}: {count}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reclassify complaints after a keyword table change')
+    parser.add_argument('--baseline', help='Tables the stored complaints were classified with')
+    parser.add_argument('--batch-size', type=int, help='Complaints classified per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Replace the baseline with the current tables afterwards')
+    parser.add_argument('--index-missing', action='store_true', help='Index complaints without terms first')
+    parser.add_argument('--report', help='Also write the report as JSON to this file')
+    args = parser.parse_args()
+
+    with configure_app().app_context():
+        if args.index_missing:
+            index_missing_terms(args.batch_size or BATCH_SIZE)
+        result = reclassify_complaints(args.baseline, args.batch_size, args.dry_run, args.save_baseline)
+        department_names = dict(db.session.query(Department.department_id, Department.name).all())
+
+    print_report(result, department_names)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(dict(result,
+                           department_moves=[[old, new, count] for (old, new), count in result['department_moves'].items()],
+                           priority_moves=[[old, new, count] for (old, new), count in result['priority_moves'].items()]),
+                      f, indent=2)
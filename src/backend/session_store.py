@@ -0,0 +1,123 @@
+# session_store.py
+#
+# Server-side sessions, used when SESSION_STORE = 'db'. The cookie only
+# carries a random session ID signed with the secret key; the session data is
+# kept in the sessions table. A row is written only when the session changed,
+# and the cookie is only sent when a session is created or cleared, instead
+# of a re-signed copy of the whole session whenever anything in it changes.
+#
+# Rows expire PERMANENT_SESSION_LIFETIME after their last write; expired rows
+# are ignored when read and deleted whenever a new session is created.
+#
+# Clearing a session deletes its row and gives whatever is stored afterwards
+# a new ID. The login views clear the session before storing the user, and
+# logout clears it, so a session ID never survives a change of privilege.
+
+import secrets
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session dict that remembers its ID and whether it was changed
+    """
+
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.cleared = False
+
+    def clear(self):
+        # Login, logout and expiry clear the session; whatever is stored
+        # afterwards (the login, a flash message) gets a new ID
+        super().clear()
+        self.cleared = True
+
+class DatabaseSessionInterface(SessionInterface):
+    """
+    Flask session interface storing sessions in a table with the columns
+    session_id, data and expires_at
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, db, model):
+        self.db = db
+        self.table = model.__table__
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+
+            if sid:
+                # Own connection, so the session never joins the view's transaction
+                with self.db.engine.connect() as connection:
+                    row = connection.execute(
+                        self.table.select().where(self.table.c.session_id == sid,
+                                                  self.table.c.expires_at > datetime.now())
+                    ).first()
+                if row is not None:
+                    return ServerSession(self.serializer.loads(row.data), sid=sid)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.cleared and session.sid:
+            with self.db.engine.begin() as connection:
+                connection.execute(self.table.delete().where(self.table.c.session_id == session.sid))
+            session.sid = None
+
+        if not session:
+            if session.cleared:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        if not session.modified:
+            return
+
+        now = datetime.now()
+        values = {'data': self.serializer.dumps(dict(session)),
+                  'expires_at': now + app.permanent_session_lifetime}
+        with self.db.engine.begin() as connection:
+            if session.sid is not None:
+                updated = connection.execute(
+                    self.table.update().where(self.table.c.session_id == session.sid).values(**values)
+                ).rowcount
+                if updated:
+                    return
+            else:
+                connection.execute(self.table.delete().where(self.table.c.expires_at <= now))
+            # New session, or one that expired while in use
+            session.sid = secrets.token_urlsafe(16)
+            connection.execute(self.table.insert().values(session_id=session.sid, **values))
+
+        response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
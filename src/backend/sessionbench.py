@@ -0,0 +1,91 @@
+# sessionbench.py
+#
+# Measures what session handling costs a logged-in user per request: time
+# per request, responses carrying a Set-Cookie header and response header
+# bytes, for each session setup:
+#   every-request  last_activity rewritten on every request (the old behaviour)
+#   coarse         last_activity rewritten every SESSION_TOUCH_INTERVAL seconds
+#   server         coarse, with SESSION_STORE = 'db' (session_store.py)
+#
+# Runs in-process through the Flask test client against a seeded SQLite file.
+#
+# Usage: python sessionbench.py [--requests N] [--path /register-complaint]
+
+import argparse
+import os
+import tempfile
+import time
+
+from flask.sessions import SecureCookieSessionInterface
+
+from loadtest import percentile, seed_database
+from session_store import DatabaseSessionInterface
+
+SETUPS = {
+    'every-request': {'SESSION_TOUCH_INTERVAL': 0, 'SESSION_STORE': 'cookie'},
+    'coarse': {'SESSION_TOUCH_INTERVAL': 60, 'SESSION_STORE': 'cookie'},
+    'server': {'SESSION_TOUCH_INTERVAL': 60, 'SESSION_STORE': 'db'}
+}
+
+def header_bytes(response):
+    # As sent on the wire: "Name: value\r\n"
+    return sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+
+def run_setup(app_module, name, email, contact_number, path, requests):
+    app = app_module.app
+    app.config.update(SETUPS[name])
+    if app.config['SESSION_STORE'] == 'db':
+        app.session_interface = DatabaseSessionInterface(app_module.db, app_module.StoredSession)
+    else:
+        app.session_interface = SecureCookieSessionInterface()
+
+    client = app.test_client()
+    client.post('/citizen-login', data={'email': email, 'contact_number': contact_number})
+    client.get(path)  # Consumes the login flash message
+
+    latencies = []
+    set_cookies = 0
+    total_header_bytes = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} answered {response.status_code} in setup {name}")
+        set_cookies += 'Set-Cookie' in response.headers
+        total_header_bytes += header_bytes(response)
+
+    return {
+        'mean_ms': sum(latencies) / requests * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'set_cookie': set_cookies / requests,
+        'header_bytes': total_header_bytes / requests
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark session handling overhead')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per setup')
+    parser.add_argument('--path', default='/register-complaint', help='Page requested by the logged-in citizen')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='pgrs-sessionbench-'), 'sessionbench.db')
+    import app as app_module
+    app = app_module.configure_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SESSION_COOKIE_SECURE': False,
+        'ADMISSION_CONTROL_ENABLED': False
+    })
+    models = {name: getattr(app_module, name) for name in ('Citizen', 'Department', 'Complaint', 'ComplaintLog')}
+    with app.app_context():
+        seed_data = seed_database(app_module.db, models, 10, 5, 100, 2)
+    _, email, contact_number = seed_data['citizens'][0]
+
+    print(f"{args.requests} requests to {args.path} per setup")
+    print(f"{'setup':<15}{'mean ms':>10}{'p95 ms':>10}{'Set-Cookie':>12}{'header bytes':>14}")
+    for name in SETUPS:
+        result = run_setup(app_module, name, email, contact_number, args.path, args.requests)
+        print(f"{name:<15}{result['mean_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+              f"{result['set_cookie']:>11.0%} {result['header_bytes']:>13.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+# shadow.py
+#
+# Shadow comparison of the live NLP engine (the NLTK rules in nlp.py) with the
+# candidate spaCy pipeline in src/NLP (main.process_complaint).
+#
+# With SHADOW_MODE_ENABLED, register_complaint hands a sample of the submitted
+# complaints (SHADOW_SAMPLE_RATE) to a background thread that runs the
+# candidate engine off the request path; when more than SHADOW_MAX_PENDING
+# texts are waiting, new ones are dropped instead of queued. The same
+# comparison can be replayed offline on stored complaints or a text file with
+# the CLI below.
+#
+# Both engines are compared on department ID: they name department 4
+# differently ("Safety" in nlp.py, "Public Safety" in src/NLP), and the IDs
+# are what gets stored; the report uses the names of nlp.py. The candidate's
+# numeric priority score is mapped back to LOW / MEDIUM / HIGH.
+#
+# The candidate's modules are loaded by file path under names of their own
+# (pgrs_candidate_<module>), so src/NLP never goes on sys.path and its
+# main.py can't be confused with another module called main. The background
+# thread loads them once before its first comparison; if that fails (e.g.
+# spaCy is not installed) the error is logged, shadow mode is off for the
+# rest of the process and /shadow-stats reports why.
+#
+# Usage: python shadow.py [--file complaints.txt] [--limit N] [--json]
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+
+from nlp import preprocess_text, categorize_complaint, assign_priority, CATEGORY_DEPARTMENTS, DEFAULT_DEPARTMENT
+
+logger = logging.getLogger(__name__)
+
+NLP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'NLP')
+
+# Modules src/NLP/main.py imports by their top-level names
+CANDIDATE_MODULES = ('categorization', 'priority')
+
+DEPARTMENT_NAMES = {department_id: name
+                    for name, department_id in (*CATEGORY_DEPARTMENTS.values(), DEFAULT_DEPARTMENT)}
+PRIORITIES = ('LOW', 'MEDIUM', 'HIGH')
+PRIORITY_BY_SCORE = {1: 'LOW', 2: 'MEDIUM', 3: 'HIGH'}
+
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class CandidateError(Exception):
+    pass
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram; percentiles are reported as the upper
+    bound of the bucket they fall in, None in the unbounded last bucket
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        milliseconds = seconds * 1000
+        index = next((i for i, bound in enumerate(self.buckets) if milliseconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += milliseconds
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return self.buckets[index] if index < len(self.buckets) else None
+
+    def stats(self):
+        labels = [f'<={bound}ms' for bound in self.buckets] + [f'>{self.buckets[-1]}ms']
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else None,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'overflow_ms': self.buckets[-1],
+            'buckets': {label: count for label, count in zip(labels, self.counts) if count}
+        }
+
+class ShadowRecorder:
+    """
+    Thread-safe latency histograms per engine and confusion counts of the
+    live (rows) against the candidate (columns) results
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latency = {'live': LatencyHistogram(), 'candidate': LatencyHistogram()}
+        self.departments = Counter()
+        self.priorities = Counter()
+        self.compared = 0
+        self.errors = Counter()
+        self.dropped = 0
+        self.disabled = None
+
+    def record(self, live, candidate, live_seconds, candidate_seconds):
+        """
+        Args:
+            live (tuple): (department_id, priority) of the live engine
+            candidate (tuple): Same for the candidate, None if it failed
+        """
+        with self._lock:
+            if live_seconds is not None:
+                self.latency['live'].record(live_seconds)
+            self.latency['candidate'].record(candidate_seconds)
+            if candidate is None:
+                self.errors['candidate'] += 1
+                return
+            self.compared += 1
+            self.departments[(live[0], candidate[0])] += 1
+            self.priorities[(live[1], candidate[1])] += 1
+
+    def record_error(self, engine):
+        with self._lock:
+            self.errors[engine] += 1
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def record_disabled(self, reason):
+        with self._lock:
+            self.disabled = reason
+
+    def report(self):
+        with self._lock:
+            department_ids = sorted({department_id for pair in self.departments for department_id in pair})
+            return {
+                'compared': self.compared,
+                'errors': dict(self.errors),
+                'dropped': self.dropped,
+                'disabled': self.disabled,
+                'latency': {engine: histogram.stats() for engine, histogram in self.latency.items()},
+                'department_agreement': _agreement(self.departments, self.compared),
+                'priority_agreement': _agreement(self.priorities, self.compared),
+                'department_confusion': _matrix(self.departments, department_ids,
+                                                lambda department_id: DEPARTMENT_NAMES.get(department_id, str(department_id))),
+                'priority_confusion': _matrix(self.priorities, PRIORITIES, str)
+            }
+
+def _agreement(confusion, total):
+    if not total:
+        return None
+    return round(sum(count for (live, candidate), count in confusion.items() if live == candidate) / total, 4)
+
+def _matrix(confusion, labels, name):
+    return {name(live): {name(candidate): confusion[(live, candidate)] for candidate in labels}
+            for live in labels}
+
+recorder = ShadowRecorder()
+
+_candidate = None
+_candidate_lock = threading.Lock()
+
+def _load_candidate_module(name):
+    spec = importlib.util.spec_from_file_location(f'pgrs_candidate_{name}', os.path.join(NLP_DIR, f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_candidate():
+    """
+    Loads process_complaint from src/NLP/main.py on first use; loading the
+    spaCy model takes seconds, so this never happens on a request thread
+
+    Raises:
+        Exception: Whatever importing the candidate raised
+    """
+    global _candidate
+    with _candidate_lock:
+        if _candidate is None:
+            # main.py's own imports only see the candidate modules while it runs
+            modules = {name: _load_candidate_module(name) for name in CANDIDATE_MODULES}
+            saved = {name: sys.modules.get(name) for name in modules}
+            sys.modules.update(modules)
+            try:
+                _candidate = _load_candidate_module('main').process_complaint
+            finally:
+                for name, module in saved.items():
+                    if module is None:
+                        del sys.modules[name]
+                    else:
+                        sys.modules[name] = module
+    return _candidate
+
+def run_live(text):
+    """
+    Returns:
+        tuple: (department_id, priority) as register_complaint stores them
+    """
+    processed_text = preprocess_text(text)
+    _, department_id = categorize_complaint(processed_text)
+    return department_id, assign_priority(processed_text)
+
+def run_candidate(text):
+    """
+    Returns:
+        tuple: (department_id, priority) of the spaCy pipeline
+
+    Raises:
+        CandidateError: If the pipeline rejects the text
+    """
+    result = load_candidate()({'description': text})
+    if result.get('status') != 'success':
+        raise CandidateError(result.get('message'))
+    return result['department_id'], PRIORITY_BY_SCORE.get(result['priority_score'], 'MEDIUM')
+
+def timed(engine, text):
+    start = time.perf_counter()
+    try:
+        result = engine(text)
+    except Exception:
+        result = None
+    return result, time.perf_counter() - start
+
+def compare(text, live=None, live_seconds=None):
+    """
+    Runs the candidate (and the live engine unless its result is given)
+    on one text and records the outcome
+    """
+    if live is None:
+        live, live_seconds = timed(run_live, text)
+        if live is None:
+            recorder.record_error('live')
+            return
+    candidate, candidate_seconds = timed(run_candidate, text)
+    recorder.record(live, candidate, live_seconds, candidate_seconds)
+
+_pending = None
+_worker_lock = threading.Lock()
+
+def _worker():
+    try:
+        load_candidate()
+    except Exception as e:
+        # Not a per-complaint error: every comparison would fail the same way
+        logger.exception("Candidate NLP engine failed to load, shadow mode disabled")
+        recorder.record_disabled(f'{type(e).__name__}: {e}')
+        return
+
+    while True:
+        text, live, live_seconds = _pending.get()
+        try:
+            compare(text, live, live_seconds)
+        finally:
+            _pending.task_done()
+
+def _start_worker(max_pending):
+    # Started lazily, so each gunicorn worker gets its own thread after the fork
+    global _pending
+    with _worker_lock:
+        if _pending is None:
+            _pending = queue.Queue(maxsize=max_pending)
+            threading.Thread(target=_worker, name='shadow-nlp', daemon=True).start()
+    return _pending
+
+def submit(text, department_id, priority, live_seconds):
+    """
+    Queues a complaint the live engine just classified for the candidate,
+    if shadow mode is on and the complaint is sampled
+    """
+    config = current_app.config
+    if not config.get('SHADOW_MODE_ENABLED', False) or recorder.disabled:
+        return
+    if random.random() >= config.get('SHADOW_SAMPLE_RATE', 1.0):
+        return
+
+    pending = _start_worker(config.get('SHADOW_MAX_PENDING', 100))
+    try:
+        pending.put_nowait((text, (department_id, priority), live_seconds))
+    except queue.Full:
+        recorder.record_dropped()
+
+def replay_texts(args):
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            texts = (line.strip() for line in f if line.strip())
+            for count, text in enumerate(texts, 1):
+                compare(text)
+                if count == args.limit:
+                    break
+        return
+
+    from app import configure_app, Complaint
+    with configure_app().app_context():
+        rows = Complaint.query.with_entities(Complaint.description).order_by(
+            Complaint.complaint_id).limit(args.limit).yield_per(500)
+        for row in rows:
+            compare(row.description)
+
+def print_report(report):
+    print(f"Compared: {report['compared']}, errors: {report['errors']}, dropped: {report['dropped']}")
+    for engine, stats in report['latency'].items():
+        if not stats['count']:
+            continue
+        bound = lambda value: f"<={value}ms" if value is not None else f">{stats['overflow_ms']}ms"
+        print(f"{engine:>9} latency: n={stats['count']} mean={stats['mean_ms']}ms "
+              f"p50{bound(stats['p50_ms'])} p95{bound(stats['p95_ms'])} p99{bound(stats['p99_ms'])}")
+    print(f"Department agreement: {report['department_agreement']}, "
+          f"priority agreement: {report['priority_agreement']}")
+    for title in ('department_confusion', 'priority_confusion'):
+        matrix = report[title]
+        labels = list(matrix)
+        print(f"\n{title.replace('_', ' ').capitalize()} (rows: live, columns: candidate)")
+        print(' ' * 15 + ''.join(f'{label[:13]:>14}' for label in labels))
+        for live in labels:
+            print(f'{live[:14]:<15}' + ''.join(f'{matrix[live][label]:>14}' for label in labels))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the live and candidate NLP engines')
+    parser.add_argument('--file', help='Complaint texts, one per line (default: stored complaints)')
+    parser.add_argument('--limit', type=int, help='Maximum number of complaints')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    try:
+        load_candidate()
+    except Exception as e:
+        sys.exit(f"Can't load the candidate engine from {os.path.normpath(NLP_DIR)}: {type(e).__name__}: {e}")
+    replay_texts(args)
+    report = recorder.report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import app as backend
+from archive import archive_resolved_complaints
+
+RESOLVED_AT = datetime.now() - timedelta(days=400)
+
+def add_resolved_complaint(db, citizen):
+    complaint = backend.Complaint(citizen_id=citizen.citizen_id, category='General', description='Broken bench',
+                                  department_id=1, priority='LOW', date_submitted=RESOLVED_AT.date())
+    db.session.add(complaint)
+    db.session.flush()
+    db.session.add(backend.ComplaintLog(complaint_id=complaint.complaint_id, status='Resolved',
+                                        timestamp=RESOLVED_AT, remarks='Fixed'))
+    db.session.commit()
+    return complaint.complaint_id
+
+def test_archive_holds_back_highest_ids(database, citizen):
+    complaint_ids = [add_resolved_complaint(database, citizen) for _ in range(3)]
+
+    result = archive_resolved_complaints(older_than_days=180)
+
+    assert result['archived'] == 2
+    assert database.session.get(backend.Complaint, complaint_ids[-1]) is not None
+    assert database.session.get(backend.ArchivedComplaint, complaint_ids[0]) is not None
+
+def test_archived_ids_are_not_reused(database, citizen):
+    complaint_ids = [add_resolved_complaint(database, citizen) for _ in range(3)]
+    archive_resolved_complaints(older_than_days=180)
+
+    # SQLite without AUTOINCREMENT, like MySQL 5.7 after a restart, continues
+    # after the highest ID left in the table
+    new_id = add_resolved_complaint(database, citizen)
+    assert new_id > max(complaint_ids)
+
+    result = archive_resolved_complaints(older_than_days=180)
+    assert result['archived'] == 1
+    archived = {row.complaint_id for row in database.session.query(backend.ArchivedComplaint.complaint_id)}
+    assert archived == set(complaint_ids)
@@ -0,0 +1,17 @@
+import app as backend
+
+def test_card_shows_edited_citizen_details(database, citizen):
+    complaint = backend.Complaint(citizen_id=citizen.citizen_id, category='General', description='Broken bench',
+                                  department_id=1, priority='LOW')
+    database.session.add(complaint)
+    database.session.commit()
+
+    with backend.app.test_request_context():
+        [card] = backend.department_complaint_cards(1, 'all', False)
+        assert 'Test Citizen' in card
+
+        citizen.name = 'Renamed Citizen'
+        database.session.commit()
+        [card] = backend.department_complaint_cards(1, 'all', False)
+        assert 'Renamed Citizen' in card
+        assert 'Renamed Citizen' in backend.department_complaint_card(1, complaint.complaint_id)
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import app as backend
+from escalation import escalate_batch
+
+def add_complaint(db, citizen, priority):
+    complaint = backend.Complaint(citizen_id=citizen.citizen_id, category='General', description='Broken bench',
+                                  department_id=1, priority=priority)
+    db.session.add(complaint)
+    db.session.commit()
+    return complaint.complaint_id
+
+def test_escalation_recorded_only_for_complaints_changed(database, citizen):
+    low_id = add_complaint(database, citizen, 'LOW')
+    # Found as LOW, but raised by someone else before the batch ran
+    changed_id = add_complaint(database, citizen, 'MEDIUM')
+
+    escalated = escalate_batch([low_id, changed_id], 'LOW', 7, datetime.now())
+
+    assert escalated == [low_id]
+    recorded = [row.complaint_id for row in database.session.query(backend.ComplaintEscalation.complaint_id)]
+    assert recorded == [low_id]
+    assert database.session.get(backend.Complaint, low_id).priority == 'MEDIUM'
+    assert database.session.get(backend.Complaint, changed_id).revision == 0
@@ -0,0 +1,38 @@
+import app as backend
+from geo import encode_geohash
+from migrate import migrate
+
+# complaints as created before the location, nlp_version and revision columns
+# (with the coordinates, to be backfilled)
+OLD_COMPLAINTS = """
+CREATE TABLE complaints (
+    complaint_id INTEGER NOT NULL PRIMARY KEY,
+    citizen_id INTEGER NOT NULL REFERENCES citizens (citizen_id),
+    category VARCHAR(50),
+    description TEXT NOT NULL,
+    department_id INTEGER NOT NULL REFERENCES departments (department_id),
+    priority VARCHAR(6) NOT NULL,
+    date_submitted DATE,
+    latitude FLOAT,
+    longitude FLOAT
+)
+"""
+
+def test_migrate_adds_columns_and_backfills_geohash(database, citizen):
+    with database.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE complaints")
+        connection.exec_driver_sql(OLD_COMPLAINTS)
+        connection.exec_driver_sql(
+            "INSERT INTO complaints (citizen_id, description, department_id, priority, latitude, longitude) "
+            "VALUES (1, 'Broken bench', 1, 'LOW', 12.97, 77.59)"
+        )
+
+    result = migrate()
+
+    assert 'column complaints.revision' in result['changes']
+    assert 'index complaints.ix_complaints_geohash' in result['changes']
+    assert result['geohashes'] == 1
+    complaint = database.session.get(backend.Complaint, 1)
+    assert complaint.geohash == encode_geohash(12.97, 77.59)
+    assert complaint.revision == 0
+    assert migrate()['changes'] == []
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+def login(client):
+    response = client.post('/citizen-login', data={'email': 'citizen@example.com', 'contact_number': '9000000001'})
+    assert response.status_code == 302
+
+def last_activity(client):
+    with client.session_transaction() as session:
+        return session.get('last_activity')
+
+def test_event_polls_do_not_keep_an_idle_session_alive(flask_app, citizen, monkeypatch):
+    monkeypatch.setitem(flask_app.config, 'EVENTS_MODE', 'poll')
+    monkeypatch.setitem(flask_app.config, 'SESSION_IDLE_TIMEOUT', timedelta(seconds=1))
+    monkeypatch.setitem(flask_app.config, 'SESSION_TOUCH_INTERVAL', 0)
+    client = flask_app.test_client()
+    login(client)
+    logged_in_at = last_activity(client)
+
+    deadline = time.monotonic() + 1.2
+    while time.monotonic() < deadline:
+        with client.get('/events/citizen') as response:
+            response.get_data()
+        assert last_activity(client) in (logged_in_at, None)
+        time.sleep(0.2)
+
+    with client.get('/events/citizen') as response:
+        assert response.status_code == 302
+    assert last_activity(client) is None
+
+def test_page_requests_keep_the_session_alive(flask_app, citizen, monkeypatch):
+    monkeypatch.setitem(flask_app.config, 'SESSION_IDLE_TIMEOUT', timedelta(seconds=1))
+    monkeypatch.setitem(flask_app.config, 'SESSION_TOUCH_INTERVAL', 0)
+    client = flask_app.test_client()
+    login(client)
+
+    deadline = time.monotonic() + 1.2
+    while time.monotonic() < deadline:
+        assert client.get('/citizen-dashboard').status_code == 200
+        time.sleep(0.2)
+    assert last_activity(client) is not None
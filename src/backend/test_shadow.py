@@ -0,0 +1,39 @@
+import json
+import time
+
+import shadow
+
+def test_overflow_percentile_is_valid_json(flask_app, monkeypatch):
+    monkeypatch.setattr(shadow, 'recorder', shadow.ShadowRecorder())
+    shadow.recorder.record(('1', 'LOW'), ('1', 'LOW'), 0.001, 60.0)
+
+    stats = shadow.recorder.report()['latency']['candidate']
+    assert stats['p99_ms'] is None
+    with flask_app.test_request_context():
+        assert json.loads(flask_app.json.dumps(shadow.recorder.report()))['latency']['candidate']['p99_ms'] is None
+
+def test_candidate_load_failure_disables_shadow_mode(flask_app, monkeypatch):
+    calls = []
+
+    def load_candidate():
+        calls.append(1)
+        raise ImportError("No module named 'spacy'")
+
+    monkeypatch.setattr(shadow, 'recorder', shadow.ShadowRecorder())
+    monkeypatch.setattr(shadow, 'load_candidate', load_candidate)
+    monkeypatch.setattr(shadow, '_pending', None)
+    monkeypatch.setitem(flask_app.config, 'SHADOW_MODE_ENABLED', True)
+    monkeypatch.setitem(flask_app.config, 'SHADOW_SAMPLE_RATE', 1.0)
+
+    with flask_app.app_context():
+        shadow.submit('Water leak on Park Street', 2, 'HIGH', 0.01)
+        deadline = time.monotonic() + 5
+        while shadow.recorder.disabled is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for _ in range(3):
+            shadow.submit('Water leak on Park Street', 2, 'HIGH', 0.01)
+
+    report = shadow.recorder.report()
+    assert 'spacy' in report['disabled']
+    assert report['errors'] == {}
+    assert calls == [1]